@@ -18,10 +18,22 @@ class _engine:
         self.safe = kwds.get("safe", None)
         self.timezone = kwds.get("timezone", None)
         self.cache_size = kwds.get("cache_size", 0)
-        self.tz_aware = kwds.get("cache_size", False)
+        self.cache_policy = kwds.get("cache_policy", "lru")
+        self.second_level_cache_size = kwds.get("second_level_cache_size", 0)
+        self.second_level_cache_ttl = kwds.get("second_level_cache_ttl", None)
+        self.tz_aware = kwds.get("tz_aware", False)
         self.autocommit = kwds.get("autocommit", False)
+        self.native_transactions = kwds.get("native_transactions", False)
+
+        from .odm.cache import CountCache, SecondLevelCache
 
         self.client = None
+        self.count_cache = CountCache()
+        self.second_level_cache = None
+        if self.second_level_cache_size != 0:
+            self.second_level_cache = SecondLevelCache(
+                maxsize=self.second_level_cache_size, ttl=self.second_level_cache_ttl
+            )
 
         self.__post_init__(*args, **kwds)
 
@@ -72,3 +72,18 @@ class SessionCacheException(Exception):
 
 class InvalidUpdateException(Exception):
     """Exception when an Update op is malformed"""
+
+
+class DuplicateDocumentException(DocumentException):
+    """Raised by a commit when new documents could not be inserted because
+    another document has the same value for a unique index.  ``documents``
+    holds the documents which weren't inserted, in the order of ``errors``,
+    the matching write errors.  The other documents were inserted."""
+
+    def __init__(self, documents, errors):
+        self.documents = documents
+        self.errors = errors
+        super(DuplicateDocumentException, self).__init__(
+            "%d document(s) not inserted: %s"
+            % (len(documents), "; ".join(e.get("errmsg", "") for e in errors))
+        )
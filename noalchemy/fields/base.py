@@ -15,6 +15,9 @@ LIST_MODIFIERS = SCALAR_MODIFIERS | {
     "$pop",
 }
 ANY_MODIFIER = LIST_MODIFIERS | NUMBER_MODIFIERS
+#: pseudo-operator of the dirty ops holding the ``arrayFilters`` of the
+#: update, as a dict of identifier to filter
+ARRAY_FILTERS = "$arrayFilters"
 
 
 class FieldMeta(type):
@@ -57,6 +60,10 @@ class FieldMeta(type):
             class_dict["wrap"] = wrap_unwrap_wrapper(class_dict["wrap"])
         if "unwrap" in class_dict:
             class_dict["unwrap"] = wrap_unwrap_wrapper(class_dict["unwrap"])
+        if "unwrap_trusted" in class_dict:
+            class_dict["unwrap_trusted"] = wrap_unwrap_wrapper(
+                class_dict["unwrap_trusted"]
+            )
 
         if "validate_wrap" in class_dict:
             class_dict["validate_wrap"] = validation_wrapper(
@@ -77,6 +84,9 @@ class Field(metaclass=FieldMeta):
     has_autoload = False
     is_sequence_field = False
     no_real_attributes = False
+    #: ``True`` if values can be changed in place, so changes to lists of
+    #: them can't be tracked (see :class:`TrackedList`)
+    has_mutable_values = False
 
     valid_modifiers = SCALAR_MODIFIERS
 
@@ -193,6 +203,15 @@ class Field(metaclass=FieldMeta):
         if self.on_update != "ignore":
             obj_value.update_op = self.on_update
 
+    def _loaded_value(self, instance):
+        """Returns the value of this field on ``instance``, or ``UNSET`` if
+        it can't have been changed in place: either it isn't set, or it was
+        lazily loaded and never read"""
+        obj_value = instance._values[self._name]
+        if obj_value.set and obj_value.loaded:
+            return obj_value.value
+        return UNSET
+
     def dirty_ops(self, instance):
         obj_value = instance._values[self._name]
 
@@ -242,6 +261,12 @@ class Field(metaclass=FieldMeta):
     def unwrap(self, value, session=None):
         raise NotImplementedError()
 
+    def unwrap_trusted(self, value, **kwargs):
+        """Like :func:`unwrap`, but only converts ``value`` without validating
+        it.  Used when loading data which was written (and so validated) by
+        noalchemy.  Fields which don't override this fall back to ``unwrap``"""
+        return self.unwrap(value, **kwargs)
+
     def validate_wrap(self, value):
         raise NotImplementedError()
 
@@ -271,3 +296,24 @@ class Field(metaclass=FieldMeta):
         except BadValueException:
             return False
         return True
+
+
+class TrackedContainer(object):
+    """Base of the ``list``, ``set`` and ``dict`` subclasses which record
+    how they are changed in place, so that only the changes are sent.
+    ``_container`` is the builtin type they derive from, and
+    ``_clear_changes`` forgets the recorded changes."""
+
+    _container = None
+
+    def __init__(self, *args, **kwargs):
+        super(TrackedContainer, self).__init__(*args, **kwargs)
+        self._clear_changes()
+
+    def __reduce__(self):
+        # pickle's default for builtin subclasses adds the items through the
+        # tracking methods, before the recorded changes are restored
+        return (type(self), (self._container(self),), self.__dict__)
+
+    def _clear_changes(self):
+        raise NotImplementedError()
@@ -7,6 +7,7 @@ class DocumentField(Field):
 
     has_subfields = True
     has_autoload = True
+    has_mutable_values = True
 
     def __init__(self, document_class, **kwargs):
         super().__init__(**kwargs)
@@ -41,7 +42,7 @@ class DocumentField(Field):
         """Returns a dict of the operations needed to update this object.
         See :func:`Document.get_dirty_ops` for more details."""
         obj_value = instance._values[self._name]
-        if not obj_value.set:
+        if not obj_value.set or not obj_value.loaded:
             return {}
 
         if not obj_value.dirty and self.__type.config_extra_fields != "ignore":
@@ -51,6 +52,9 @@ class DocumentField(Field):
 
         ret = {}
         for op, values in ops.items():
+            if op == ARRAY_FILTERS:
+                ret[op] = values
+                continue
             ret[op] = {}
             for key, value in values.items():
                 name = "%s.%s" % (self._name, key)
@@ -88,6 +92,11 @@ class DocumentField(Field):
         self.validate_unwrap(value, fields=fields, session=session)
         return self.type.unwrap(value, fields=fields, session=session)
 
+    def unwrap_trusted(self, value, fields=None, session=None):
+        """Use the document's class to unwrap the value without validating
+        its fields"""
+        return self.type.unwrap(value, fields=fields, session=session, trusted=True)
+
     def validate_wrap(self, value):
         """Checks that ``value`` is an instance of ``DocumentField.type``.
         if it is, then validation on its fields has already been done and
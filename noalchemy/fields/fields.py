@@ -23,6 +23,9 @@ class PrimitiveField(Field):
         self.validate_unwrap(value)
         return self.constructor(value)
 
+    def unwrap_trusted(self, value, session=None):
+        return self.constructor(value)
+
 
 class StringField(PrimitiveField):
     """Unicode Strings.  ``str`` is used to wrap and unwrap values,
@@ -188,6 +191,9 @@ class DateTimeField(PrimitiveField):
 
     def unwrap(self, value, session=None):
         self.validate_unwrap(value)
+        return self.unwrap_trusted(value, session=session)
+
+    def unwrap_trusted(self, value, session=None):
         value = self.constructor(value)
         if value.tzinfo is not None:
             import pytz
@@ -296,6 +302,12 @@ class TupleField(Field):
             ret.append(field.unwrap(value, session=session))
         return tuple(ret)
 
+    def unwrap_trusted(self, value, session=None):
+        ret = []
+        for field, value in zip(self.types, value):
+            ret.append(field.unwrap_trusted(value, session=session))
+        return tuple(ret)
+
 
 class GeoField(TupleField):
     def __init__(self, **kwargs):
@@ -374,12 +386,20 @@ class EnumField(Field):
                 return val
         self._fail_validation(value, "Value was not in the enum values")
 
+    def unwrap_trusted(self, value, session=None):
+        value = self.item_type.unwrap_trusted(value, session=session)
+        for val in self.values:
+            if val == value:
+                return val
+        return value
+
 
 class AnythingField(Field):
     """A field that passes through whatever is set with no validation.  Useful
     for free-form objects"""
 
     valid_modifiers = ANY_MODIFIER
+    has_mutable_values = True
 
     def schema_json(self):
         return super(AnythingField, self).schema_json()
@@ -459,6 +479,9 @@ class ObjectIdField(Field):
         self.validate_unwrap(value)
         return value
 
+    def unwrap_trusted(self, value, session=None):
+        return value
+
 
 class ComputedField(Field):
     """A computed field is generated based on an object's other values.  It
@@ -594,6 +617,9 @@ class ComputedField(Field):
         self.validate_unwrap(value)
         return self.computed_type.unwrap(value, session=session)
 
+    def unwrap_trusted(self, value, session=None):
+        return self.computed_type.unwrap_trusted(value, session=session)
+
 
 class computed_field(object):
     def __init__(self, computed_type, deps=None, **kwargs):
@@ -1,7 +1,8 @@
 from __future__ import print_function
 
 from ..exc import BadFieldSpecification, BadValueException
-from .base import SCALAR_MODIFIERS, Field
+from ..util import UNSET
+from .base import ARRAY_FILTERS, SCALAR_MODIFIERS, Field, TrackedContainer
 
 
 class DictField(Field):
@@ -9,6 +10,7 @@ class DictField(Field):
     Strings must also obey the MongoDB key rules (no '.' or '$')."""
 
     valid_modifiers = SCALAR_MODIFIERS
+    has_mutable_values = True
 
     def __init__(self, value_type, default_empty=False, **kwargs):
         """Initialize the DictField.
@@ -19,7 +21,7 @@ class DictField(Field):
             **kwargs: Additional keyword arguments.
         """
         if default_empty:
-            kwargs["default_f"] = dict
+            kwargs["default_f"] = TrackedDict
         super(DictField, self).__init__(**kwargs)
         self.value_type = value_type
         self.default_empty = default_empty
@@ -42,6 +44,31 @@ class DictField(Field):
     def set_parent_on_subtypes(self, parent):
         self.value_type._set_parent(parent)
 
+    def dirty_ops(self, instance):
+        ops = super(DictField, self).dirty_ops(instance)
+        value = self._loaded_value(instance)
+        if ops or value is UNSET:
+            return ops
+        if isinstance(value, TrackedDict) and value._changed_count():
+            ops = self._changes(value)
+            if ops is None:
+                ops = {"$set": {self.db_field: self.wrap(value)}}
+        return ops
+
+    def _changes(self, value):
+        """Returns a ``$set``/``$unset`` of each changed key, or ``None``
+        if setting the whole dict is smaller"""
+        if value._changed_count() * 2 > len(value):
+            return None
+        ops = {}
+        for k in value._added | value._changed:
+            self._validate_key_wrap(k)
+            name = "%s.%s" % (self.db_field, k)
+            ops.setdefault("$set", {})[name] = self.value_type.wrap(value[k])
+        for k in value._removed:
+            ops.setdefault("$unset", {})["%s.%s" % (self.db_field, k)] = True
+        return ops
+
     def _validate_key_wrap(self, key):
         if not isinstance(key, str):
             self._fail_validation(key, "DictField keys must be of type str")
@@ -95,9 +122,15 @@ class DictField(Field):
         its value unwrapped using DictField.value_type.
         """
         self.validate_unwrap(value)
-        ret = {}
+        ret = TrackedDict()
+        for k, v in value.items():
+            dict.__setitem__(ret, k, self.value_type.unwrap(v, session=session))
+        return ret
+
+    def unwrap_trusted(self, value, session=None):
+        ret = TrackedDict()
         for k, v in value.items():
-            ret[k] = self.value_type.unwrap(v, session=session)
+            dict.__setitem__(ret, k, self.value_type.unwrap_trusted(v, session=session))
         return ret
 
 
@@ -108,19 +141,24 @@ class KVField(DictField):
 
     has_subfields = True
 
-    def __init__(self, key_type, value_type, default_empty=False, **kwargs):
+    def __init__(
+        self, key_type, value_type, default_empty=False, array_filters=False, **kwargs
+    ):
         """Initialize the KVField.
 
         Args:
             key_type (Field): The field type to use for the keys.
             value_type (Field): The field type to use for the values.
             default_empty (bool, optional): Whether to set an empty dictionary as the default value. Defaults to False.
+            array_filters (bool, optional): Whether to update the values of existing keys in place with
+                ``arrayFilters`` (MongoDB 3.6+) instead of setting the whole list. Defaults to False.
             **kwargs: Additional keyword arguments.
         """
         if default_empty:
-            kwargs["default_f"] = dict
+            kwargs["default_f"] = TrackedDict
         super(KVField, self).__init__(value_type, **kwargs)
         self.default_empty = default_empty
+        self.array_filters = array_filters
 
         if not isinstance(key_type, Field):
             raise BadFieldSpecification("KVField key type is not a field!")
@@ -150,6 +188,35 @@ class KVField(DictField):
             "v": self.value_type,
         }
 
+    def _changes(self, value):
+        """Returns the update for the changed keys: new pairs are pushed,
+        removed ones pulled, and with ``array_filters`` the values of
+        existing keys are set in place.  Returns ``None`` if the whole list
+        has to be set, which is also the case for several kinds of changes
+        at once since they would update the same array"""
+        kinds = bool(value._added) + bool(value._removed) + bool(value._changed)
+        if kinds != 1 or (value._changed and not self.array_filters):
+            return None
+        name = self.db_field
+        wrap_key = self.key_type.wrap
+        if value._added:
+            pairs = [
+                {"k": wrap_key(k), "v": self.value_type.wrap(value[k])}
+                for k in value._added
+            ]
+            return {"$push": {name: {"$each": pairs}}}
+        if value._removed:
+            keys = [wrap_key(k) for k in value._removed]
+            return {"$pull": {name: {"k": {"$in": keys}}}}
+        ops = {"$set": {}, ARRAY_FILTERS: {}}
+        for i, k in enumerate(value._changed):
+            # identifiers must be unique within the update
+            identifier = "kv%x%d" % (id(value), i)
+            path = "%s.$[%s].v" % (name, identifier)
+            ops["$set"][path] = self.value_type.wrap(value[k])
+            ops[ARRAY_FILTERS][identifier] = {"%s.k" % identifier: wrap_key(k)}
+        return ops
+
     def _validate_key_wrap(self, key):
         try:
             self.key_type.validate_wrap(key)
@@ -209,11 +276,82 @@ class KVField(DictField):
         constructs the dictionary from the list.
         """
         self.validate_unwrap(value)
-        ret = {}
+        ret = TrackedDict()
         for value_dict in value:
-            k = value_dict["k"]
-            v = value_dict["v"]
-            ret[self.key_type.unwrap(k, session=session)] = self.value_type.unwrap(
-                v, session=session
-            )
+            k = self.key_type.unwrap(value_dict["k"], session=session)
+            v = self.value_type.unwrap(value_dict["v"], session=session)
+            dict.__setitem__(ret, k, v)
+        return ret
+
+    def unwrap_trusted(self, value, session=None):
+        ret = TrackedDict()
+        for value_dict in value:
+            k = self.key_type.unwrap_trusted(value_dict["k"], session=session)
+            v = self.value_type.unwrap_trusted(value_dict["v"], session=session)
+            dict.__setitem__(ret, k, v)
         return ret
+
+
+class TrackedDict(TrackedContainer, dict):
+    """A dict which records the keys added, changed and removed since it
+    was loaded or saved, so that :func:`DictField.dirty_ops` only updates
+    those keys instead of the whole mapping.  Values changed in place
+    (e.g. a list value being appended to) are not noticed."""
+
+    _container = dict
+
+    def _clear_changes(self):
+        self._added = set()
+        self._changed = set()
+        self._removed = set()
+
+    def _changed_count(self):
+        return len(self._added) + len(self._changed) + len(self._removed)
+
+    def __setitem__(self, key, value):
+        if key in self._added:
+            pass
+        elif key in self or key in self._removed:
+            self._removed.discard(key)
+            self._changed.add(key)
+        else:
+            self._added.add(key)
+        super(TrackedDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super(TrackedDict, self).__delitem__(key)
+        if key in self._added:
+            self._added.discard(key)
+        else:
+            self._changed.discard(key)
+            self._removed.add(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super(TrackedDict, self).pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
@@ -9,6 +9,23 @@ class RefBase(Field):
     def rel(self, allow_none=False):
         return Proxy(self, allow_none=allow_none)
 
+    @property
+    def ref_type(self):
+        """The :class:`Document` class references point to, or ``None`` if
+        it has to be looked up from the referenced collection"""
+        if self.type is None:
+            return None
+        return self.type.type
+
+    def _dbref(self, value):
+        """Returns the stored ``value`` as a ``DBRef``"""
+        return value
+
+    def dereference(self, session, ref, allow_none=False):
+        return session.dereference(
+            self._dbref(ref), allow_none=allow_none, type=self.ref_type
+        )
+
 
 class SRefField(RefBase):
     has_subfields = True
@@ -31,12 +48,10 @@ class SRefField(RefBase):
     def _to_ref(self, doc):
         return doc.mongo_id
 
-    def dereference(self, session, ref, allow_none=False):
-        ref = DBRef(
-            id=ref, collection=self.type.type.get_collection_name(), database=self.db
+    def _dbref(self, value):
+        return DBRef(
+            id=value, collection=self.type.type.get_collection_name(), database=self.db
         )
-        ref.type = self.type.type
-        return session.dereference(ref, allow_none=allow_none)
 
     def set_parent_on_subtypes(self, parent):
         self.type.parent = parent
@@ -49,6 +64,9 @@ class SRefField(RefBase):
         self.validate_unwrap(value)
         return value
 
+    def unwrap_trusted(self, value, fields=None, session=None):
+        return value
+
     def validate_unwrap(self, value, session=None):
         if not isinstance(value, ObjectId):
             self._fail_validation_type(value, ObjectId)
@@ -90,7 +108,6 @@ class RefField(RefBase):
 
     def wrap(self, value):
         self.validate_wrap(value)
-        value.type = self.type
         return value
 
     def _to_ref(self, doc):
@@ -98,15 +115,10 @@ class RefField(RefBase):
 
     def unwrap(self, value, fields=None, session=None):
         self.validate_unwrap(value)
-        value.type = self.type
         return value
 
-    def dereference(self, session, ref, allow_none=False):
-        from ..odm.document import collection_registry
-
-        ref.type = collection_registry["global"][ref.collection]
-        obj = session.dereference(ref, allow_none=allow_none)
-        return obj
+    def unwrap_trusted(self, value, fields=None, session=None):
+        return value
 
     def set_parent_on_subtypes(self, parent):
         if self.type:
@@ -1,11 +1,13 @@
 from __future__ import print_function
 
 from ..exc import BadFieldSpecification
-from .base import LIST_MODIFIERS, BadValueException, Field
+from ..util import UNSET
+from .base import LIST_MODIFIERS, BadValueException, Field, TrackedContainer
 
 
 class SequenceField(Field):
     is_sequence_field = True
+    has_mutable_values = True
     valid_modifiers = LIST_MODIFIERS
 
     def __init__(
@@ -51,6 +53,13 @@ class SequenceField(Field):
     def _dereference(self, session, ref, allow_none=False):
         return self.item_type.dereference(session, ref, allow_none=allow_none)
 
+    def _dereference_many(self, session, refs, allow_none=False):
+        return session.dereference_many(
+            [self.item_type._dbref(ref) for ref in refs],
+            allow_none=allow_none,
+            type=self.item_type.ref_type,
+        )
+
     def wrap_value(self, value):
         try:
             return self.item_type.wrap_value(value)
@@ -69,6 +78,12 @@ class SequenceField(Field):
     def child_type(self):
         return self.item_type
 
+    @property
+    def tracks_changes(self):
+        """Whether values loaded from the database are tracked containers,
+        which is only possible if the items can't be changed in place"""
+        return not self.item_type.has_mutable_values
+
     def _validate_child_wrap(self, value):
         self.item_type.validate_wrap(value)
 
@@ -103,17 +118,24 @@ class SequenceField(Field):
         super(SequenceField, self).set_value(instance, value)
 
     def dirty_ops(self, instance):
-        obj_value = instance._values[self._name]
         ops = super(SequenceField, self).dirty_ops(instance)
-        if len(ops) == 0 and obj_value.set:
-            ops = {"$set": {self.db_field: self.wrap(obj_value.value)}}
-        return ops
+        value = self._loaded_value(instance)
+        if ops or value is UNSET:
+            return ops
+        if isinstance(value, (TrackedList, TrackedSet)) and self.tracks_changes:
+            ops = value._changes(self)
+            if ops is not None:
+                return ops
+        return {"$set": {self.db_field: self.wrap(value)}}
 
 
 class ListField(SequenceField):
     def __init__(self, item_type, **kwargs):
         if kwargs.get("default_empty"):
-            kwargs["default_f"] = list
+            if item_type.has_mutable_values:
+                kwargs["default_f"] = list
+            else:
+                kwargs["default_f"] = TrackedList
         super(ListField, self).__init__(item_type, **kwargs)
 
     def rel(self, ignore_missing=False):
@@ -145,13 +167,24 @@ class ListField(SequenceField):
         if self.has_autoload:
             kwargs["session"] = session
         self.validate_unwrap(value, **kwargs)
-        return [self.item_type.unwrap(v, **kwargs) for v in value]
+        value = [self.item_type.unwrap(v, **kwargs) for v in value]
+        return TrackedList(value) if self.tracks_changes else value
+
+    def unwrap_trusted(self, value, session=None):
+        kwargs = {}
+        if self.has_autoload:
+            kwargs["session"] = session
+        value = [self.item_type.unwrap_trusted(v, **kwargs) for v in value]
+        return TrackedList(value) if self.tracks_changes else value
 
 
 class SetField(SequenceField):
     def __init__(self, item_type, **kwargs):
         if kwargs.get("default_empty"):
-            kwargs["default_f"] = set
+            if item_type.has_mutable_values:
+                kwargs["default_f"] = set
+            else:
+                kwargs["default_f"] = TrackedSet
         super(SetField, self).__init__(item_type, **kwargs)
 
     def rel(self, ignore_missing=False):
@@ -171,7 +204,201 @@ class SetField(SequenceField):
 
     def unwrap(self, value, session=None):
         self.validate_unwrap(value)
-        return set([self.item_type.unwrap(v, session=session) for v in value])
+        return TrackedSet([self.item_type.unwrap(v, session=session) for v in value])
+
+    def unwrap_trusted(self, value, session=None):
+        return TrackedSet(
+            [self.item_type.unwrap_trusted(v, session=session) for v in value]
+        )
+
+
+class TrackedList(TrackedContainer, list):
+    """A list which records how it is changed, so that
+    :func:`SequenceField.dirty_ops` can send the changes made since the
+    document was loaded or saved instead of the whole list:
+
+    * items added with ``append``, ``extend`` or ``+=`` are ``$push``-ed
+    * items removed with ``remove`` are ``$pull``-ed, as long as no equal \
+      item is left in the list
+    * items assigned by index get a positional ``$set``
+
+    Other changes, or more than one kind of change at once, fall back to
+    a ``$set`` of the whole list.
+    """
+
+    _container = list
+
+    def _clear_changes(self):
+        self._length = len(self)
+        self._appended = False
+        self._removed = []
+        self._assigned = set()
+        self._replaced = False
+
+    def _changes(self, field):
+        """Returns the update operations for the recorded changes, or
+        ``None`` if the whole list has to be set"""
+        kinds = bool(self._appended) + bool(self._removed) + bool(self._assigned)
+        if self._replaced or kinds > 1:
+            return None
+        wrap = field.item_type.wrap
+        name = field.db_field
+        if self._appended:
+            items = [wrap(v) for v in self[self._length :]]
+            return {"$push": {name: {"$each": items}}}
+        if self._removed:
+            if any(v in self for v in self._removed):
+                return None
+            if len(self._removed) == 1:
+                return {"$pull": {name: wrap(self._removed[0])}}
+            return {"$pullAll": {name: [wrap(v) for v in self._removed]}}
+        if self._assigned:
+            # one positional $set per item is only smaller for a few items
+            if len(self._assigned) * 2 > len(self):
+                return None
+            return {"$set": {"%s.%d" % (name, i): wrap(self[i]) for i in self._assigned}}
+        return {}
+
+    def append(self, value):
+        super(TrackedList, self).append(value)
+        self._appended = True
+
+    def extend(self, values):
+        super(TrackedList, self).extend(values)
+        self._appended = True
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def remove(self, value):
+        super(TrackedList, self).remove(value)
+        self._removed.append(value)
+
+    def __setitem__(self, index, value):
+        super(TrackedList, self).__setitem__(index, value)
+        if isinstance(index, int) and not self._appended and not self._removed:
+            self._assigned.add(index % len(self))
+        else:
+            self._replaced = True
+
+    def __delitem__(self, index):
+        super(TrackedList, self).__delitem__(index)
+        self._replaced = True
+
+    def __imul__(self, count):
+        self._replaced = True
+        return super(TrackedList, self).__imul__(count)
+
+    def insert(self, index, value):
+        super(TrackedList, self).insert(index, value)
+        self._replaced = True
+
+    def pop(self, index=-1):
+        self._replaced = True
+        return super(TrackedList, self).pop(index)
+
+    def clear(self):
+        super(TrackedList, self).clear()
+        self._replaced = True
+
+    def sort(self, **kwargs):
+        super(TrackedList, self).sort(**kwargs)
+        self._replaced = True
+
+    def reverse(self):
+        super(TrackedList, self).reverse()
+        self._replaced = True
+
+
+class TrackedSet(TrackedContainer, set):
+    """A set which records the items added and removed, so that
+    :func:`SequenceField.dirty_ops` can send them with ``$addToSet`` or
+    ``$pullAll`` instead of setting the whole list.  Other changes, or both
+    additions and removals, fall back to a ``$set`` of the whole list."""
+
+    _container = set
+
+    def _clear_changes(self):
+        self._added = set()
+        self._removed = set()
+        self._replaced = False
+
+    def _changes(self, field):
+        """Returns the update operations for the recorded changes, or
+        ``None`` if the whole list has to be set"""
+        if self._replaced or (self._added and self._removed):
+            return None
+        wrap = field.item_type.wrap
+        name = field.db_field
+        if self._added:
+            return {"$addToSet": {name: {"$each": [wrap(v) for v in self._added]}}}
+        if self._removed:
+            return {"$pullAll": {name: [wrap(v) for v in self._removed]}}
+        return {}
+
+    def add(self, value):
+        if value not in self:
+            if value in self._removed:
+                self._removed.discard(value)
+            else:
+                self._added.add(value)
+        super(TrackedSet, self).add(value)
+
+    def discard(self, value):
+        if value in self:
+            if value in self._added:
+                self._added.discard(value)
+            else:
+                self._removed.add(value)
+        super(TrackedSet, self).discard(value)
+
+    def remove(self, value):
+        if value not in self:
+            raise KeyError(value)
+        self.discard(value)
+
+    def update(self, *iterables):
+        for iterable in iterables:
+            for value in iterable:
+                self.add(value)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def difference_update(self, *iterables):
+        for iterable in iterables:
+            for value in iterable:
+                self.discard(value)
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def pop(self):
+        self._replaced = True
+        return super(TrackedSet, self).pop()
+
+    def clear(self):
+        super(TrackedSet, self).clear()
+        self._replaced = True
+
+    def intersection_update(self, *iterables):
+        super(TrackedSet, self).intersection_update(*iterables)
+        self._replaced = True
+
+    def symmetric_difference_update(self, other):
+        super(TrackedSet, self).symmetric_difference_update(other)
+        self._replaced = True
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
 
 
 class ListProxy(object):
@@ -185,13 +412,19 @@ class ListProxy(object):
         session = instance._get_session()
 
         def iterator():
-            for v in getattr(instance, self.field._name):
+            refs = list(getattr(instance, self.field._name))
+            values = iter(
+                self.field._dereference_many(
+                    session,
+                    [v for v in refs if v is not None],
+                    allow_none=self.ignore_missing,
+                )
+            )
+            for v in refs:
                 if v is None:
                     yield v
                     continue
-                value = self.field._dereference(
-                    session, v, allow_none=self.ignore_missing
-                )
+                value = next(values)
                 if value is None and self.ignore_missing:
                     continue
                 yield value
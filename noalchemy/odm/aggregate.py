@@ -0,0 +1,187 @@
+from bson import SON
+from pymongo import ASCENDING, DESCENDING
+
+from ..util import resolve_name
+from .query_expression import (BadQueryException, FreeFormDoc, QueryExpression,
+                               QueryField, flatten)
+
+
+class Aggregation:
+    """Builds an aggregation pipeline on the collection of ``type``, created
+    with :func:`Session.aggregate`.  Stages are added in the order the
+    methods are called, and :class:`QueryField` values anywhere in a stage
+    are replaced with their ``$``-prefixed absolute name::
+
+        session.aggregate(Post).match(Post.n > 3).group(
+            Post.author, total={"$sum": Post.n}
+        ).sort(("total", DESCENDING))
+
+    Iterating over the aggregation runs it and streams the results, as
+    dicts unless :func:`as_documents` was called."""
+
+    def __init__(self, type, session, exclude_subclasses=False):
+        self.session = session
+        self.type = type
+        self._base_query = type.base_query(exclude_subclasses)
+        self._stages = []
+        self._result_type = None
+        self._allow_disk_use = False
+        self._batch_size = None
+        self._max_time_ms = None
+
+    def __iter__(self):
+        return self.session.execute_aggregation(self)
+
+    def all(self):
+        return [obj for obj in iter(self)]
+
+    def first(self):
+        for obj in iter(self):
+            return obj
+        return None
+
+    def pipeline(self):
+        """Returns the stages sent to the server"""
+        pipeline = []
+        if self._base_query:
+            pipeline.append({"$match": flatten(self._base_query)})
+        pipeline.extend(self._stages)
+        return pipeline
+
+    def stage(self, stage):
+        """Appends a raw ``stage``, after resolving its query fields"""
+        self._stages.append(_expression(stage))
+        return self
+
+    def match(self, *query_expressions, **filters):
+        """Adds a ``$match`` stage, built from query expressions (or dicts)
+        like :func:`Query.filter` and from keyword filters like
+        :func:`Query.filter_by`"""
+        query = {}
+        for qe in query_expressions:
+            obj = qe.obj if isinstance(qe, QueryExpression) else qe
+            for k, v in flatten(obj).items():
+                _merge(query, k, v)
+        for name, value in filters.items():
+            for k, v in flatten((resolve_name(self.type, name) == value).obj).items():
+                _merge(query, k, v)
+        self._stages.append({"$match": query})
+        return self
+
+    def group(self, _id, **accumulators):
+        """Adds a ``$group`` stage.
+
+        :param _id: the grouping key: a field, a dict of fields or \\
+                expressions, or ``None`` to group all the documents
+        :param accumulators: the accumulator of each output field, \\
+                e.g. ``total={"$sum": Post.n}``
+        """
+        group = {"_id": self._field_expression(_id)}
+        for name, accumulator in accumulators.items():
+            group[name] = _expression(accumulator)
+        self._stages.append({"$group": group})
+        return self
+
+    def project(self, *fields, **expressions):
+        """Adds a ``$project`` stage keeping ``fields`` and computing the
+        ``expressions``"""
+        projection = {}
+        for f in fields:
+            projection[self._field_name(f)] = 1
+        for name, expression in expressions.items():
+            projection[name] = _expression(expression)
+        self._stages.append({"$project": projection})
+        return self
+
+    def sort(self, *sort_tuples):
+        """Adds a ``$sort`` stage from ``(field, direction)`` pairs"""
+        sort = SON()
+        for name, direction in sort_tuples:
+            if direction not in (ASCENDING, DESCENDING):
+                raise BadQueryException("Bad sort direction: %s" % direction)
+            sort[self._field_name(name)] = direction
+        self._stages.append({"$sort": sort})
+        return self
+
+    def unwind(self, qfield, preserve_empty=False):
+        """Adds an ``$unwind`` stage on the list field ``qfield``"""
+        path = "$" + self._field_name(qfield)
+        if preserve_empty:
+            stage = {"path": path, "preserveNullAndEmptyArrays": True}
+        else:
+            stage = path
+        self._stages.append({"$unwind": stage})
+        return self
+
+    def limit(self, limit):
+        self._stages.append({"$limit": limit})
+        return self
+
+    def skip(self, skip):
+        self._stages.append({"$skip": skip})
+        return self
+
+    def allow_disk_use(self, allow_disk_use=True):
+        """Let the server write temporary files for large stages"""
+        self._allow_disk_use = allow_disk_use
+        return self
+
+    def batch_size(self, batch_size):
+        self._batch_size = batch_size
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        self._max_time_ms = max_time_ms
+        return self
+
+    def as_documents(self, type=None):
+        """Unwrap the results into documents of ``type`` (the aggregated
+        class by default) instead of returning dicts.  The results must
+        still have the shape of a document, e.g. after ``$match``, ``$sort``
+        or ``$lookup`` stages."""
+        self._result_type = type or self.type
+        return self
+
+    def _field_name(self, qfield):
+        if isinstance(qfield, str):
+            # any name is valid on a collection given by name
+            if isinstance(self.type, FreeFormDoc):
+                return qfield
+            # output fields of earlier stages aren't document fields
+            if qfield.partition(".")[0] not in self.type.get_fields():
+                return qfield
+        return str(resolve_name(self.type, qfield))
+
+    def _field_expression(self, value):
+        if isinstance(value, str):
+            return "$" + self._field_name(value)
+        return _expression(value)
+
+
+def _merge(query, key, value):
+    if key not in query:
+        query[key] = value
+        return
+    if not isinstance(query[key], dict) or not isinstance(value, dict):
+        raise BadQueryException("Multiple assignments to a field must all be dicts.")
+    query[key].update(value)
+
+
+def _expression(value):
+    """Replaces the query fields in ``value`` with field paths, and the
+    query fields used as keys with their names"""
+    if isinstance(value, QueryField):
+        return "$" + value.get_absolute_name()
+    if isinstance(value, SON):
+        return SON((_key(k), _expression(v)) for k, v in value.items())
+    if isinstance(value, dict):
+        return {_key(k): _expression(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_expression(v) for v in value]
+    return value
+
+
+def _key(key):
+    if isinstance(key, QueryField):
+        return key.get_absolute_name()
+    return key
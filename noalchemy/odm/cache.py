@@ -0,0 +1,400 @@
+"""
+
+Identity map implementations used by :class:`~noalchemy.odm.session.Session`
+to cache loaded documents by ``mongo_id``.
+
+The eviction policy is picked with the ``cache_policy`` argument of
+``create_engine``, and the size bound with ``cache_size`` (``None`` for an
+unbounded cache).  Every policy runs its operations in constant time and
+keeps ``hits``, ``misses`` and ``evictions`` counters.
+
+:class:`SecondLevelCache` is an optional engine-wide cache shared by every
+session, holding raw documents of the classes with ``config_cache = True``.
+:class:`CountCache` keeps the results of ``Query.count(cache_ttl=...)``.
+
+"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from weakref import WeakValueDictionary
+
+import bson
+
+from ..exc import SessionCacheException
+
+
+class IdentityCache(object):
+    """Base class for the session caches.  Subclasses implement
+    ``_get``, ``_put``, ``_evict`` and ``_remove``."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the value cached for ``key`` (and counts a hit), or
+        ``default`` (and counts a miss)"""
+        if key not in self:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self._get(key)
+
+    def put(self, key, value):
+        """Caches ``value`` for ``key``, evicting an entry first if the cache
+        is full"""
+        if key not in self and self.maxsize is not None:
+            while len(self) >= self.maxsize and len(self):
+                self._evict()
+                self.evictions += 1
+        self._put(key, value)
+
+    def pop(self, key, default=None):
+        if key not in self:
+            return default
+        return self._remove(key)
+
+    def stats(self):
+        return dict(
+            size=len(self),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self._get(key)
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._remove(key)
+
+
+class FIFOCache(IdentityCache):
+    """Evicts the entry which was inserted first"""
+
+    def __init__(self, maxsize=None):
+        super(FIFOCache, self).__init__(maxsize)
+        self._data = OrderedDict()
+
+    def _get(self, key):
+        return self._data[key]
+
+    def _put(self, key, value):
+        self._data[key] = value
+
+    def _evict(self):
+        self._data.popitem(last=False)
+
+    def _remove(self, key):
+        return self._data.pop(key)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+
+class LRUCache(FIFOCache):
+    """Evicts the least recently read or written entry"""
+
+    def _get(self, key):
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def _put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+
+
+class LFUCache(IdentityCache):
+    """Evicts the least frequently read entry, the least recently used one
+    among entries with the same count"""
+
+    def __init__(self, maxsize=None):
+        super(LFUCache, self).__init__(maxsize)
+        self._data = {}
+        self._counts = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def _touch(self, key):
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def _get(self, key):
+        self._touch(key)
+        return self._data[key]
+
+    def _put(self, key, value):
+        if key in self._data:
+            self._data[key] = value
+            self._touch(key)
+            return
+        self._data[key] = value
+        self._counts[key] = 1
+        self._buckets[1][key] = None
+        self._min_count = 1
+
+    def _evict(self):
+        bucket = self._buckets[self._min_count]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self._buckets[self._min_count]
+        del self._counts[key]
+        del self._data[key]
+        # evictions only happen from put(), which resets _min_count to 1
+
+    def _remove(self, key):
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count and self._buckets:
+                self._min_count = min(self._buckets)
+        return self._data.pop(key)
+
+    def clear(self):
+        self._data.clear()
+        self._counts.clear()
+        self._buckets.clear()
+        self._min_count = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+
+class WeakCache(IdentityCache):
+    """Holds weak references to the cached documents, so a document is
+    dropped from the cache once the application no longer references it,
+    while identity is preserved for the live ones.  If ``maxsize`` is set,
+    the oldest entry is evicted first.  Values which can't be weakly
+    referenced (like the ``None`` cached for missing references) are not
+    cached."""
+
+    def __init__(self, maxsize=None):
+        super(WeakCache, self).__init__(maxsize)
+        self._data = WeakValueDictionary()
+
+    def _get(self, key):
+        return self._data[key]
+
+    def _put(self, key, value):
+        try:
+            self._data[key] = value
+        except TypeError:
+            pass
+
+    def _evict(self):
+        del self._data[next(iter(self._data))]
+
+    def _remove(self, key):
+        return self._data.pop(key)
+
+    def get(self, key, default=None):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+
+cache_policies = {
+    "fifo": FIFOCache,
+    "lru": LRUCache,
+    "lfu": LFUCache,
+    "weak": WeakCache,
+}
+
+
+def create_cache(policy="lru", maxsize=None):
+    """Creates an identity cache for the eviction ``policy``, which is either
+    the name of a registered policy (see ``cache_policies``) or an
+    :class:`IdentityCache` subclass"""
+    if isinstance(policy, type) and issubclass(policy, IdentityCache):
+        return policy(maxsize)
+    if policy not in cache_policies:
+        raise SessionCacheException("Unknown cache policy: %r" % (policy,))
+    return cache_policies[policy](maxsize)
+
+
+class SecondLevelCache(object):
+    """A cache of raw documents keyed by ``(collection, _id)``, shared by
+    all the sessions of an engine.  Documents are stored BSON-encoded, so
+    every read returns a fresh copy, and expire after ``ttl`` seconds.
+
+    Writes invalidate entries through :func:`invalidate`.  Each collection
+    has a generation number, bumped on every invalidation: :func:`put` only
+    stores a document if no write happened since ``generation`` was read,
+    so a read racing with a write can't cache stale data.
+
+    :param maxsize: maximum number of documents, ``None`` for no bound
+    :param ttl: lifetime of an entry in seconds, ``None`` for no expiry
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._generations = defaultdict(int)
+        self._flushed = {}
+        self._lock = threading.Lock()
+
+    def generation(self, collection):
+        """Returns the current generation of ``collection``, to be passed to
+        :func:`put` for a document read after this call"""
+        with self._lock:
+            return self._generations[collection]
+
+    def get(self, collection, id):
+        """Returns a copy of the document cached for ``id``, or ``None``"""
+        key = (collection, id)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, generation, data = entry
+                stale = generation < self._flushed.get(collection, 0)
+                if stale or (expires is not None and expires < time.monotonic()):
+                    del self._data[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return bson.decode(data)
+
+    def put(self, collection, id, document, generation):
+        """Caches ``document``, unless ``collection`` was written to since
+        ``generation`` was read"""
+        data = bson.encode(document)
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+        key = (collection, id)
+        with self._lock:
+            if generation != self._generations[collection]:
+                return
+            self._data[key] = (expires, generation, data)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, collection, id=None):
+        """Drops the document ``id`` of ``collection``, or every document of
+        ``collection`` if ``id`` is ``None``"""
+        with self._lock:
+            self._generations[collection] += 1
+            if id is None:
+                self._flushed[collection] = self._generations[collection]
+            else:
+                self._data.pop((collection, id), None)
+
+    def clear(self):
+        with self._lock:
+            for collection in list(self._generations):
+                self._generations[collection] += 1
+                self._flushed[collection] = self._generations[collection]
+            self._data.clear()
+
+    def stats(self):
+        return dict(
+            size=len(self._data),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CountCache(object):
+    """Query counts shared by all the sessions of an engine, each kept for
+    the ``cache_ttl`` given to :func:`~noalchemy.odm.query.Query.count`.
+    Counts are not invalidated by writes.
+
+    :param maxsize: maximum number of counts, the oldest is evicted first
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the count cached for ``key`` if it hasn't expired, or
+        ``None``"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, count = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return count
+
+    def put(self, key, count, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, count)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -19,10 +19,13 @@ programmatically.  A document can have multiple indexes by adding extra
 """
 
 import inspect
+import threading
+import weakref
 from collections import defaultdict
 
 import pymongo
-from bson import DBRef
+from bson import DBRef, decode
+from bson.raw_bson import RawBSONDocument
 
 from ..exc import (DocumentException, ExtraValueException, FieldNotRetrieved,
                    MissingValueException)
@@ -30,6 +33,10 @@ from ..fields import DocumentField, Field, ObjectIdField
 
 document_type_registry = defaultdict(dict)
 collection_registry = defaultdict(dict)
+#: ``{id(client): {(database, collection): index specs}}``.  Keyed by id so
+#: clients aren't kept alive: an entry is dropped when its client is collected
+index_registry = {}
+index_registry_lock = threading.Lock()
 
 
 class DocumentMeta(type):
@@ -92,9 +99,32 @@ class DocumentMeta(type):
             if current is None or issubclass(current, new_class):
                 collection_registry[ns][collection] = new_class
 
+        new_class._codec = DocumentCodec(new_class)
+
         return new_class
 
 
+class DocumentCodec(object):
+    """Field tables of a :class:`Document` class, compiled once by
+    :class:`DocumentMeta` so that :func:`Document.wrap` and
+    :func:`Document.unwrap` don't have to look up fields by name for every
+    value they convert"""
+
+    def __init__(self, cls):
+        #: ``(name, field)`` for every field of the class, in definition order
+        self.fields = list(cls.get_fields().items())
+        #: ``db_field -> (name, field, has_autoload, is_document, localize)``
+        self.db_fields = {}
+        for name, field in self.fields:
+            self.db_fields[field.db_field] = (
+                name,
+                field,
+                field.has_autoload,
+                isinstance(field, DocumentField),
+                type(field).localize is not Field.localize,
+            )
+
+
 class Document(metaclass=DocumentMeta):
     mongo_id = ObjectIdField(required=False, db_field="_id", on_update="ignore")
 
@@ -105,6 +135,7 @@ class Document(metaclass=DocumentMeta):
     config_full_name = None
     config_default_sort = None
     config_extra_fields = "error"
+    config_cache = False
 
     def __init__(self, retrieved_fields=None, loading_from_db=False, **kwargs):
         self.partial = retrieved_fields is not None
@@ -118,16 +149,16 @@ class Document(metaclass=DocumentMeta):
         fields = self.get_fields()
         for name, field in fields.items():
             if self.partial and field.db_field not in self.retrieved_fields:
-                self._values[name] = Value(field, self, retrieved=False)
+                self._values[name] = Value(field, retrieved=False)
             elif name in kwargs:
                 field = getattr(cls, name)
                 value = kwargs[name]
-                self._values[name] = Value(field, self, from_db=loading_from_db)
+                self._values[name] = Value(field, from_db=loading_from_db)
                 field.set_value(self, value)
             elif field.auto:
-                self._values[name] = Value(field, self, from_db=False)
+                self._values[name] = Value(field, from_db=False)
             else:
-                self._values[name] = Value(field, self, from_db=False)
+                self._values[name] = Value(field, from_db=False)
 
         for k in kwargs:
             if k not in fields:
@@ -148,6 +179,7 @@ class Document(metaclass=DocumentMeta):
             config_polymorphic_identity=cls.config_polymorphic_identity,
             config_full_name=cls.config_full_name,
             config_extra_fields=cls.config_extra_fields,
+            config_cache=cls.config_cache,
         )
         for f in cls.get_fields():
             ret["fields"][f] = getattr(cls, f).schema_json()
@@ -262,12 +294,13 @@ class Document(metaclass=DocumentMeta):
 
     @classmethod
     def get_indexes(cls):
-        ret = []
-        for name in dir(cls):
-            field = getattr(cls, name)
-            if isinstance(field, Index):
-                ret.append(field)
-        return ret
+        if "_indexes" not in cls.__dict__:
+            cls._indexes = []
+            for name in dir(cls):
+                field = getattr(cls, name)
+                if isinstance(field, Index):
+                    cls._indexes.append(field)
+        return cls._indexes
 
     @classmethod
     def transform_incoming(self, obj, session):
@@ -300,12 +333,8 @@ class Document(metaclass=DocumentMeta):
         )
 
     def wrap(self):
-        res = {}
-        for k, v in self.__extra_fields.items():
-            res[k] = v
-        cls = self.__class__
-        for name in self.get_fields():
-            field = getattr(cls, name)
+        res = dict(self.__extra_fields)
+        for name, field in self._codec.fields:
             try:
                 value = getattr(self, name)
                 res[field.db_field] = field.wrap(value)
@@ -318,58 +347,110 @@ class Document(metaclass=DocumentMeta):
         return res
 
     @classmethod
-    def unwrap(cls, obj, fields=None, session=None):
+    def unwrap(cls, obj, fields=None, session=None, trusted=False, lazy=False):
         """ Returns an instance of this document class based on the mongo object
             ``obj``.  This is done by using the ``unwrap()`` methods of the
             underlying fields to set values.
 
-            :param obj: a ``SON`` object returned from a mongo database
+            :param obj: a ``SON`` (or ``RawBSONDocument``) object returned \
+                    from a mongo database
             :param fields: A list of :class:`noalchemy.query.QueryField` objects \
                     for the fields to load.  If ``None`` is passed all fields  \
                     are loaded
+            :param trusted: If ``True``, ``obj`` is only converted and not \
+                    validated (see :func:`Field.unwrap_trusted`).  Use \
+                    :func:`validate` to check the document afterwards
+            :param lazy: If ``True``, each field is only unwrapped the first \
+                    time it is accessed (see :class:`LazyValue`).  Validation \
+                    errors are then raised on access
         """
         subclass = cls.get_subclass(obj)
         if subclass and subclass != cls:
-            unwrapped = subclass.unwrap(obj, fields=fields, session=session)
+            unwrapped = subclass.unwrap(
+                obj, fields=fields, session=session, trusted=trusted, lazy=lazy
+            )
             unwrapped._session = session
             return unwrapped
-        # Get reverse name mapping
-        name_reverse = {}
-        for name, field in cls.get_fields().items():
-            name_reverse[field.db_field] = name
-        # Unwrap
-        params = {}
-        for k, v in obj.items():
-            k = name_reverse.get(k, k)
-            if not hasattr(cls, k) and cls.config_extra_fields:
-                params[str(k)] = v
-                continue
 
-            field = getattr(cls, k)
-            field_is_doc = fields is not None and isinstance(
-                field.get_type(), DocumentField
-            )
+        db_fields = cls._codec.db_fields
+        normalized_fields = None
+        if fields is not None:
+            normalized_fields = cls.__normalize(fields)
+        loader = FieldLoader(
+            session, trusted, normalized_fields, raw=isinstance(obj, RawBSONDocument)
+        )
+        lazy = lazy and cls.__init__ is Document.__init__
 
-            extra_unwrap = {}
-            if field.has_autoload:
-                extra_unwrap["session"] = session
-            if field_is_doc:
-                normalized_fields = cls.__normalize(fields)
-                unwrapped = field.unwrap(
-                    v, fields=normalized_fields.get(k), **extra_unwrap
-                )
+        values = {}
+        extra = {}
+        load = loader.load
+        for k, v in obj.items():
+            entry = db_fields.get(k)
+            if entry is None:
+                extra[str(k)] = v
+            elif lazy:
+                values[entry[0]] = (entry, v)
             else:
-                unwrapped = field.unwrap(v, **extra_unwrap)
-            unwrapped = field.localize(session, unwrapped)
-            params[str(k)] = unwrapped
+                values[entry[0]] = load(entry, v)
 
-        if fields is not None:
-            params["retrieved_fields"] = fields
-        obj = cls(loading_from_db=True, **params)
-        obj._mark_clean()
+        obj = cls._from_db(values, extra, fields, loader=loader if lazy else None)
         obj._session = session
         return obj
 
+    @classmethod
+    def _from_db(cls, values, extra, fields=None, loader=None):
+        """Builds an instance from already unwrapped ``values``.  Unless the
+        class overrides ``__init__``, the :class:`Value` slots are filled in
+        directly instead of going through ``Field.set_value``, since the
+        values were validated when they were unwrapped.  With a ``loader``,
+        ``values`` holds ``(codec entry, raw value)`` pairs which are
+        unwrapped lazily."""
+        if cls.__init__ is not Document.__init__:
+            params = dict(extra)
+            params.update(values)
+            if fields is not None:
+                params["retrieved_fields"] = fields
+            obj = cls(loading_from_db=True, **params)
+            obj._mark_clean()
+            return obj
+
+        if extra and cls.config_extra_fields != "ignore":
+            raise ExtraValueException(next(iter(extra)))
+
+        obj = cls.__new__(cls)
+        obj.partial = fields is not None
+        obj.retrieved_fields = cls.__normalize(fields)
+        obj.__extra_fields = extra
+        obj.__extra_fields_orig = dict(extra)
+
+        obj._values = _values = {}
+        for name, field in cls._codec.fields:
+            if obj.partial and field.db_field not in obj.retrieved_fields:
+                _values[name] = Value(field, retrieved=False)
+            elif name in values and loader is not None:
+                entry, raw = values[name]
+                _values[name] = LazyValue(field, entry, raw, loader)
+            elif name in values:
+                value = _values[name] = Value(field, from_db=True)
+                value.value = values[name]
+                value.set = True
+            else:
+                _values[name] = Value(field, from_db=False)
+        return obj
+
+    def validate(self):
+        """Validates every value set on this document, raising
+        :class:`~noalchemy.exc.BadValueException` on the first bad one.  Only
+        needed for documents loaded with validation turned off.  Runs the
+        checks of both directions: the unwrap checks (and
+        ``unwrap_validator``) are run on the wrapped value, as when loading"""
+        for name, field in self._codec.fields:
+            value = self._values[name]
+            if value.set:
+                field.validate_wrap(value.value)
+                field.validate_unwrap(field.wrap(value.value))
+        return self
+
     _session = None
 
     def _get_session(self):
@@ -382,6 +463,17 @@ class Document(metaclass=DocumentMeta):
         for k, v in self._values.items():
             v.clear_dirty()
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_session", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        fields = self.get_fields()
+        for name, value in self._values.items():
+            value.field = fields[name]
+
 
 class DictDoc(object):
     """Adds a mapping interface to a document. Supports __getitem__ and
@@ -427,11 +519,61 @@ class BadIndexException(Exception):
     pass
 
 
+def _collection_key(collection):
+    return (collection.database.name, collection.name)
+
+
+def _client_registry(client):
+    key = id(client)
+    with index_registry_lock:
+        registry = index_registry.get(key)
+        if registry is None:
+            registry = index_registry[key] = defaultdict(set)
+            weakref.finalize(client, index_registry.pop, key, None)
+    return registry
+
+
+def ensure_indexes(collection, indexes):
+    """Creates the indexes in ``indexes`` which have not been ensured on
+    ``collection`` yet by this process.  Missing indexes are created with
+    a single ``create_indexes`` call and remembered in ``index_registry``,
+    so subsequent calls do not hit the server.
+
+    :param collection: the pymongo collection to ensure the indexes on
+    :param indexes: a list of :class:`Index` objects
+    """
+    client = collection.database.client
+    ensured = _client_registry(client)[_collection_key(collection)]
+    missing = [index for index in indexes if index.spec not in ensured]
+    if not missing:
+        return
+
+    collection.create_indexes([index.index_model() for index in missing])
+    with index_registry_lock:
+        ensured.update(index.spec for index in missing)
+
+
+def invalidate_indexes(collection=None):
+    """Forgets which indexes have been ensured, so that they are created
+    again on the next operation.  Useful after dropping a collection or
+    its indexes.
+
+    :param collection: the pymongo collection to invalidate.  If ``None``, \
+            the whole registry is cleared
+    """
+    with index_registry_lock:
+        if collection is None:
+            index_registry.clear()
+        else:
+            registry = index_registry.get(id(collection.database.client), {})
+            registry.pop(_collection_key(collection), None)
+
+
 class Index(object):
     """This class is used in the class definition of a Document to
-    specify a single, possibly compound, index. pymongo's ensure_index
-    will be called on each index before a database operation is executed
-    on the owner document class.
+    specify a single, possibly compound, index. Each index is created with
+    pymongo's create_indexes the first time a database operation is
+    executed on the owner document class (see :func:`ensure_indexes`).
 
     Example
 
@@ -516,37 +658,116 @@ class Index(object):
         self.__drop_dups = drop_dups
         return self
 
-    def ensure(self, collection):
-        """Call the pymongo method ensure_index on the passed collection.
-
-        :param collection: the pymongo collection to ensure this index is on
-        """
+    def _components(self):
         components = []
         for c in self.components:
             if isinstance(c[0], Field):
                 c = (c[0].db_field, c[1])
+            elif not isinstance(c[0], str):
+                c = (str(c[0]), c[1])
             components.append(c)
+        return components
 
+    def _extras(self):
         extras = {}
+        if self.__unique:
+            extras["unique"] = True
+        if self.__drop_dups:
+            extras["dropDups"] = True
         if self.__min is not None:
             extras["min"] = self.__min
         if self.__max is not None:
             extras["max"] = self.__max
         if self.__bucket_size is not None:
-            extras["bucket_size"] = self.__bucket_size
+            extras["bucketSize"] = self.__bucket_size
         if self.__expire_after is not None:
             extras["expireAfterSeconds"] = self.__expire_after
+        return extras
 
-        collection.ensure_index(
-            components, unique=self.__unique, drop_dups=self.__drop_dups, **extras
-        )
+    @property
+    def spec(self):
+        """A hashable description of this index, used as its key in
+        ``index_registry``"""
+        return (tuple(self._components()), tuple(sorted(self._extras().items())))
+
+    def index_model(self):
+        """Returns the pymongo ``IndexModel`` for this index"""
+        return pymongo.IndexModel(self._components(), **self._extras())
+
+    def ensure(self, collection):
+        """Create this index on the passed collection if it has not been
+        ensured by this process yet.
+
+        :param collection: the pymongo collection to ensure this index is on
+        """
+        ensure_indexes(collection, [self])
         return self
 
 
+def _inflate(value):
+    """Decodes the ``RawBSONDocument`` values nested in ``value`` into dicts"""
+    if isinstance(value, RawBSONDocument):
+        value = decode(value.raw)
+        if "$ref" in value and "$id" in value:
+            return DBRef(value.pop("$ref"), value.pop("$id"), value.pop("$db", None), **value)
+        return value
+    if isinstance(value, list):
+        return [_inflate(v) for v in value]
+    return value
+
+
+class FieldLoader(object):
+    """Unwraps the values of a document loaded from the database, using the
+    entries of :attr:`DocumentCodec.db_fields`.  If ``raw`` is set the
+    document is a ``RawBSONDocument``: embedded documents are then decoded
+    only when the field holding them is unwrapped, and passed on as raw
+    documents to :class:`DocumentField`"""
+
+    def __init__(self, session=None, trusted=False, fields=None, raw=False):
+        self.session = session
+        self.trusted = trusted
+        self.fields = fields
+        self.raw = raw
+
+    def load(self, entry, value):
+        name, field, has_autoload, is_document, localize = entry
+        if self.raw and not is_document:
+            value = _inflate(value)
+        extra_unwrap = {}
+        if has_autoload:
+            extra_unwrap["session"] = self.session
+        if is_document and self.fields is not None:
+            extra_unwrap["fields"] = self.fields.get(field.db_field)
+        if self.trusted:
+            value = field.unwrap_trusted(value, **extra_unwrap)
+        else:
+            value = field.unwrap(value, **extra_unwrap)
+        if localize:
+            value = field.localize(self.session, value)
+        return value
+
+
 class Value(object):
-    def __init__(self, field, document, from_db=False, extra=False, retrieved=True):
+    """The state of one field of a document.  Documents hold one per field,
+    so attributes are kept in ``__slots__`` rather than a per-instance
+    ``__dict__``"""
+
+    __slots__ = (
+        "field",
+        "value",
+        "from_db",
+        "set",
+        "extra",
+        "dirty",
+        "retrieved",
+        "update_op",
+    )
+
+    #: ``False`` while a :class:`LazyValue` hasn't been unwrapped yet
+    loaded = True
+
+    def __init__(self, field, from_db=False, extra=False, retrieved=True):
         self.field = field
-        self.doc = document
         self.value = None
 
         self.from_db = from_db
@@ -556,9 +777,21 @@ class Value(object):
         self.retrieved = retrieved
         self.update_op = None
 
+    def __getstate__(self):
+        # field is restored by Document.__setstate__, and reading ``value``
+        # unwraps a LazyValue first
+        return {name: getattr(self, name) for name in Value.__slots__[1:]}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def clear_dirty(self):
         self.dirty = False
         self.update_op = None
+        # tracked lists and sets record their changes from now on
+        if self.loaded and hasattr(self.value, "_clear_changes"):
+            self.value._clear_changes()
 
     def delete(self):
         self.value = None
@@ -566,3 +799,30 @@ class Value(object):
         self.dirty = True
         self.from_db = False
         self.update_op = "$unset"
+
+
+class LazyValue(Value):
+    """A value loaded from the database which is only unwrapped the first
+    time it is read, then cached like a regular :class:`Value`"""
+
+    __slots__ = ("loaded", "_value", "_entry", "_raw", "_loader")
+
+    def __init__(self, field, entry, raw, loader):
+        super(LazyValue, self).__init__(field, from_db=True)
+        self.set = True
+        self.loaded = False
+        self._entry = entry
+        self._raw = raw
+        self._loader = loader
+
+    @property
+    def value(self):
+        if not self.loaded:
+            self.value = self._loader.load(self._entry, self._raw)
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self.loaded = True
+        self._entry = self._raw = self._loader = None
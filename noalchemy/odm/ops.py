@@ -1,14 +1,21 @@
 from abc import ABC, abstractmethod
+from copy import deepcopy
 from itertools import chain
 
 from bson import ObjectId
+from pymongo import (DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany,
+                     UpdateOne)
 
 from ..exc import InvalidUpdateException
+from ..fields import ARRAY_FILTERS
 
 
 class Operation(ABC):
     @abstractmethod
-    def execute(self):
+    def bulk_requests(self):
+        """Returns the list of pymongo write models applying this operation,
+        which :func:`Session.commit` batches with those of the other
+        operations on the same collection into a single ``bulk_write``"""
         pass
 
     def update_cache(self):
@@ -21,6 +28,23 @@ class Operation(ABC):
     def ensure_indexes(self):
         self.session.auto_ensure_indexes(self.type)
 
+    def invalidate_cache(self):
+        """Drops the documents this operation writes from the engine's second
+        level cache.  Called by :func:`Session.commit` once the operation
+        was sent"""
+        self.session.invalidate_second_level_cache(self.type)
+
+    def coalesce_key(self):
+        """The ``_id`` of the single document this operation writes, or
+        ``None`` if it may write several documents (see :func:`coalesce`)"""
+        return None
+
+    def coalesce(self, previous):
+        """Returns the operation which has the effect of ``previous``
+        followed by this one, both writing the same document, or ``None`` if
+        they can't be combined"""
+        return None
+
 
 class ClearCollectionOp(Operation):
     def __init__(self, trans_id, session, kind):
@@ -28,8 +52,8 @@ class ClearCollectionOp(Operation):
         self.session = session
         self.type = kind
 
-    def execute(self):
-        self.collection.delete_many({})
+    def bulk_requests(self):
+        return [DeleteMany({})]
 
 
 class UpdateDocumentOp(Operation):
@@ -62,6 +86,9 @@ class UpdateDocumentOp(Operation):
             )
 
         self.dirty_ops = document.get_dirty_ops(with_required=upsert)
+        self.array_filters = None
+        if ARRAY_FILTERS in self.dirty_ops:
+            self.array_filters = list(self.dirty_ops.pop(ARRAY_FILTERS).values())
         for key, op in chain(update_ops.items(), kwargs.items()):
             key = str(key)
             for current_op, keys in list(self.dirty_ops.items()):
@@ -73,11 +100,48 @@ class UpdateDocumentOp(Operation):
                     del self.dirty_ops[current_op]
         document._mark_clean()
 
-    def execute(self):
-        self.ensure_indexes()
-        return self.collection.update_one(
-            self.db_key, {"$set": self.dirty_ops}, upsert=self.upsert
-        )
+    def invalidate_cache(self):
+        _id = self.db_key.get("_id")
+        if _id is None or isinstance(_id, dict):
+            _id = None
+        self.session.invalidate_second_level_cache(self.type, _id)
+
+    def coalesce_key(self):
+        _id = self.db_key.get("_id")
+        if len(self.db_key) != 1 or _id is None or isinstance(_id, dict):
+            return None
+        return _id
+
+    def coalesce(self, previous):
+        if self.array_filters is not None or not _is_plain_update(self.dirty_ops):
+            return None
+        if isinstance(previous, SaveOp):
+            data = _apply_update(previous.data, self.dirty_ops)
+            if data is None:
+                return None
+            previous.data = data
+            return previous
+        if isinstance(previous, UpdateDocumentOp):
+            if previous.array_filters is not None or previous.upsert != self.upsert:
+                return None
+            dirty_ops = _merge_updates(previous.dirty_ops, self.dirty_ops)
+            if dirty_ops is None:
+                return None
+            self.dirty_ops = dirty_ops
+            return self
+        return None
+
+    def bulk_requests(self):
+        if not self.dirty_ops:
+            return []
+        return [
+            UpdateOne(
+                self.db_key,
+                self.dirty_ops,
+                upsert=self.upsert,
+                array_filters=self.array_filters,
+            )
+        ]
 
 
 class UpdateOp(Operation):
@@ -87,14 +151,12 @@ class UpdateOp(Operation):
         self.type = kind
         self.safe = safe
         self.query = update_obj.query.query
-        self.update_data = {"$set": update_obj.update_data}
+        self.update_data = update_obj.update_data
         self.upsert = update_obj._get_upsert()
         self.multi = update_obj._get_multi()
 
-    def execute(self):
-        return self.collection.update_many(
-            self.query, self.update_data, upsert=self.upsert
-        )
+    def bulk_requests(self):
+        return [UpdateMany(self.query, self.update_data, upsert=self.upsert)]
 
 
 class SaveOp(Operation):
@@ -104,16 +166,31 @@ class SaveOp(Operation):
         self.data = document.wrap()
         self.type = type(document)
         self.safe = safe
-        if "_id" not in self.data:
+        self.document = document
+        #: ``True`` if the ``_id`` was generated here, so the document can be
+        #: inserted instead of upserted
+        self.new = "_id" not in self.data
+        if self.new:
             self.data["_id"] = ObjectId()
             document.mongo_id = self.data["_id"]
         document._mark_clean()
 
-    def execute(self):
-        self.ensure_indexes()
-        return self.collection.replace_one(
-            {"_id": self.data["_id"]}, self.data, upsert=True
-        )
+    def invalidate_cache(self):
+        self.session.invalidate_second_level_cache(self.type, self.data["_id"])
+
+    def coalesce_key(self):
+        return self.data["_id"]
+
+    def coalesce(self, previous):
+        # the document is replaced as a whole
+        if isinstance(previous, SaveOp) and previous.new:
+            self.new = True
+        return self
+
+    def bulk_requests(self):
+        if self.new:
+            return [InsertOne(self.data)]
+        return [ReplaceOne({"_id": self.data["_id"]}, self.data, upsert=True)]
 
 
 class RemoveOp(Operation):
@@ -124,9 +201,8 @@ class RemoveOp(Operation):
         self.safe = safe
         self.type = kind
 
-    def execute(self):
-        self.ensure_indexes()
-        return self.collection.delete_many(self.query)
+    def bulk_requests(self):
+        return [DeleteMany(self.query)]
 
 
 class RemoveDocumentOp(Operation):
@@ -139,10 +215,223 @@ class RemoveDocumentOp(Operation):
         if obj.has_id():
             self.id = obj.mongo_id
 
-    def execute(self):
+    def invalidate_cache(self):
+        if self.id is not None:
+            self.session.invalidate_second_level_cache(self.type, self.id)
+
+    def coalesce_key(self):
+        return self.id
+
+    def coalesce(self, previous):
+        # a document which was never written doesn't need to be removed
+        if isinstance(previous, SaveOp) and previous.new:
+            return DROP
+        # writes before a removal are lost anyway
+        return self
+
+    def bulk_requests(self):
         if self.id is None:
-            return
-        db = self.session.db
-        self.ensure_indexes()
-        collection = db[self.type.get_collection_name()]
-        return collection.delete_one({"_id": self.id})
+            return []
+        return [DeleteOne({"_id": self.id})]
+
+
+#: returned by :func:`Operation.coalesce` when both operations cancel out
+DROP = object()
+
+
+def coalesce(ops):
+    """Merges consecutive operations of ``ops`` which write the same
+    document, so each run of writes to a document is sent once.  Operations
+    are never moved past another write: the order of ``ops`` is kept.
+
+    Returns the operations to execute and the ones merged away."""
+    result = []
+    merged = []
+    for op in ops:
+        key = op.coalesce_key()
+        if key is not None and result and result[-1].coalesce_key() == key:
+            previous = result[-1]
+            combined = op.coalesce(previous)
+            if combined is DROP:
+                result.pop()
+                merged.extend([previous, op])
+                continue
+            if combined is not None:
+                result[-1] = combined
+                merged.append(previous if combined is op else op)
+                continue
+        result.append(op)
+    return result, merged
+
+
+def _is_plain_update(update):
+    return set(update) <= {"$set", "$unset"}
+
+
+def _prefixes(path):
+    parts = path.split(".")
+    return {".".join(parts[:i]) for i in range(1, len(parts))}
+
+
+def _merge_updates(first, second):
+    """Returns a ``$set``/``$unset`` update equivalent to ``first`` followed
+    by ``second``, or ``None`` if a path of one is inside a path of the other
+    (they would conflict in a single update)"""
+    if not _is_plain_update(first):
+        return None
+    first_paths = set(first.get("$set", {})) | set(first.get("$unset", {}))
+    second_paths = set(second.get("$set", {})) | set(second.get("$unset", {}))
+    for paths, others in ((first_paths, second_paths), (second_paths, first_paths)):
+        for path in paths:
+            if _prefixes(path) & others:
+                return None
+
+    set_ = dict(first.get("$set", {}))
+    unset = dict(first.get("$unset", {}))
+    for path, value in second.get("$set", {}).items():
+        unset.pop(path, None)
+        set_[path] = value
+    for path in second.get("$unset", {}):
+        set_.pop(path, None)
+        unset[path] = True
+    update = {}
+    if set_:
+        update["$set"] = set_
+    if unset:
+        update["$unset"] = unset
+    return update
+
+
+def _apply_update(data, update):
+    """Returns a copy of the document ``data`` with the ``$set``/``$unset``
+    ``update`` applied, or ``None`` if a path can't be followed"""
+    data = deepcopy(data)
+    changes = [(path, value, False) for path, value in update.get("$set", {}).items()]
+    changes += [(path, None, True) for path in update.get("$unset", {})]
+    for path, value, unset in changes:
+        parts = path.split(".")
+        target = data
+        for part in parts[:-1]:
+            if isinstance(target, dict):
+                if part not in target:
+                    if unset:
+                        break
+                    target[part] = {}
+                target = target[part]
+            elif isinstance(target, list) and part.isdigit() and int(part) < len(target):
+                target = target[int(part)]
+            else:
+                return None
+        else:
+            last = parts[-1]
+            if isinstance(target, dict):
+                if unset:
+                    target.pop(last, None)
+                else:
+                    target[last] = value
+            elif isinstance(target, list) and last.isdigit() and int(last) < len(target):
+                target[int(last)] = None if unset else value
+            else:
+                return None
+    return data
+
+
+class OpResult:
+    """The outcome of a single queued operation within a commit.
+    ``applied`` is ``True`` once the operation was written, ``False`` if it
+    failed (``error`` then holds the server's write error) or wasn't sent
+    because an earlier operation failed, and ``None`` if unknown (the
+    commit failed with an error which isn't a write error)"""
+
+    def __init__(self, op, upserted_id=None, applied=True, error=None):
+        self.op = op
+        self.upserted_id = upserted_id
+        self.applied = applied
+        self.error = error
+
+
+class CommitResult:
+    """Combined result of the ``bulk_write`` calls issued by
+    :func:`Session.commit`.  ``op_results`` holds one :class:`OpResult` per
+    operation, in the order they were sent.  When a commit fails, the
+    exception raised has a ``commit_result`` attribute holding the results
+    of every operation of the commit."""
+
+    def __init__(self):
+        self.bulk_results = []
+        self.op_results = []
+        self.__inserted = 0
+        #: operations merged into others before the commit (see :func:`coalesce`)
+        self.coalesced = []
+
+    def add(self, ops, owners, bulk_result):
+        """Records ``bulk_result`` for the batch made of ``ops``. ``owners``
+        maps each request index of the batch to the operation it came from"""
+        self.bulk_results.append(bulk_result)
+        upserted = {}
+        if bulk_result is not None:
+            for index, _id in bulk_result.upserted_ids.items():
+                upserted[owners[index]] = _id
+        for op in ops:
+            self.op_results.append(OpResult(op, upserted_id=upserted.get(op)))
+
+    def add_failed(self, ops, owners, details):
+        """Records the batch made of ``ops`` whose ordered ``bulk_write``
+        failed with the ``BulkWriteError`` ``details``: the operations
+        before the first write error were applied, the following ones were
+        not sent"""
+        self.__inserted += details.get("nInserted", 0)
+        upserted = {owners[u["index"]]: u["_id"] for u in details.get("upserted", [])}
+        errors = details.get("writeErrors", [])
+        failed = owners[errors[0]["index"]] if errors else None
+        applied = True
+        for op in ops:
+            if op is failed:
+                self.op_results.append(OpResult(op, applied=False, error=errors[0]))
+                applied = False
+                continue
+            self.op_results.append(
+                OpResult(op, upserted_id=upserted.get(op), applied=applied)
+            )
+
+    def add_inserts(self, ops, inserted_count, errors=()):
+        """Records new documents inserted by ``insert_many``.  ``errors``
+        are the write errors of the call, indexed like ``ops``"""
+        self.__inserted += inserted_count
+        errors = {error["index"]: error for error in errors}
+        for index, op in enumerate(ops):
+            error = errors.get(index)
+            self.op_results.append(OpResult(op, applied=error is None, error=error))
+
+    def add_unsent(self, ops, applied=False):
+        """Records operations which weren't sent (or, with ``applied`` set
+        to ``None``, whose outcome is unknown)"""
+        recorded = set(result.op for result in self.op_results)
+        for op in ops:
+            if op not in recorded:
+                self.op_results.append(OpResult(op, applied=applied))
+
+    def __sum(self, name):
+        return sum(
+            getattr(result, name) for result in self.bulk_results if result is not None
+        )
+
+    @property
+    def inserted_count(self):
+        return self.__sum("inserted_count") + self.__inserted
+
+    @property
+    def matched_count(self):
+        return self.__sum("matched_count")
+
+    @property
+    def modified_count(self):
+        return self.__sum("modified_count")
+
+    @property
+    def deleted_count(self):
+        return self.__sum("deleted_count")
+
+    @property
+    def upserted_count(self):
+        return self.__sum("upserted_count")
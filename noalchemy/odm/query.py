@@ -1,32 +1,101 @@
+import base64
+import inspect
+import queue
+import threading
+import warnings
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from datetime import datetime
 
+import bson
+from bson import SON, Decimal128, Int64, ObjectId
+from bson.raw_bson import RawBSONDocument
 from pymongo import ASCENDING, DESCENDING
 
 from ..exc import BadResultException
+from ..fields import RefBase, RefField, SequenceField
 from ..util import resolve_name
-from .query_expression import BadQueryException, QueryExpression, flatten
+from .query_expression import BadQueryException, QueryExpression, QueryField, flatten
 from .update_expression import FindAndModifyExpression, UpdateExpression
 
 
+#: document class -> {name: weak references to the fields along the name}
+_resolved_paths = weakref.WeakKeyDictionary()
+
+
+def _field_path(qfield):
+    path = []
+    while qfield is not None:
+        path.append(weakref.ref(qfield.get_type()))
+        qfield = qfield._get_parent()
+    return tuple(reversed(path))
+
+
+def _resolve_name(type, name):
+    """Like :func:`~noalchemy.util.resolve_name`, but the fields along the
+    names of document classes are cached, so the filters of hot queries
+    don't walk the attributes again.  A new
+    :class:`~noalchemy.odm.query_expression.QueryField` is returned by every
+    call, since ``exclude()``, ``elem_match()`` and ``matched_index()``
+    change it in place.  Fields refer to their class, so only weak
+    references to them are kept, and a class can still be collected"""
+    if not isinstance(name, str) or not inspect.isclass(type):
+        return resolve_name(type, name)
+    paths = _resolved_paths.setdefault(type, {})
+    fields = [ref() for ref in paths.get(name, ())]
+    if fields and None not in fields:
+        qfield = None
+        for field in fields:
+            qfield = QueryField(field, parent=qfield)
+        return qfield
+    qfield = resolve_name(type, name)
+    if isinstance(qfield, QueryField):
+        path = _field_path(qfield)
+        # names going through something other than subfields aren't cached
+        if len(path) == name.count(".") + 1:
+            paths[name] = path
+    return qfield
+
+
 class Query:
     def __init__(self, type, session, exclude_subclasses=False):
         self.session = session
         self.type = type
 
         self.__query = type.base_query(exclude_subclasses)
+        self.__compiled = None
+        self.__compiled_fields = None
         self._sort = []
         self._fields = None
         self.hints = []
         self._limit = None
         self._skip = None
+        self._batch_size = None
+        self._max_time_ms = None
         self._raw_output = False
+        self._trusted = False
+        self._lazy = False
+        self._raw_bson = False
+        self._prefetch = []
+        self._lookups = []
+        self._process_pool = None
 
     def __iter__(self):
         return self.__get_query_result()
 
     @property
     def query(self):
-        return flatten(self.__query)
+        """The filter sent to the server.  It is built once and reused until
+        the query is changed, so it must not be modified."""
+        if self.__compiled is None:
+            self.__compiled = flatten(self.__query)
+        return self.__compiled
+
+    def __add_condition(self, condition):
+        self.__query.setdefault("$and", []).append(condition)
+        self.__compiled = None
 
     def __get_query_result(self):
         return self.session.execute_query(self, self.session)
@@ -35,6 +104,174 @@ class Query:
         self._raw_output = True
         return self
 
+    def trusted(self, trusted=True):
+        """Skip validation when unwrapping the results of this query.  The
+        data is assumed to have been validated when it was written; use
+        :func:`Document.validate` to check a document on demand."""
+        self._trusted = trusted
+        return self
+
+    def raw_bson(self, raw_bson=True):
+        """Read the results as ``RawBSONDocument`` instead of decoding them
+        into dicts.  With :func:`raw_output` the raw documents are returned
+        as-is (their bytes are in ``.raw``), otherwise they are unwrapped
+        directly from BSON.  Combine with :func:`lazy` to only decode the
+        fields which are accessed."""
+        self._raw_bson = raw_bson
+        return self
+
+    def lazy(self, lazy=True):
+        """Unwrap the fields of the returned documents on first access
+        instead of when they are loaded.  Useful when only a few fields of
+        large documents are read."""
+        self._lazy = lazy
+        return self
+
+    def process_pool(self, executor, chunk_size=500, max_pending=8, as_dicts=False):
+        """Unwrap the results in the worker processes of ``executor``, a
+        ``concurrent.futures.ProcessPoolExecutor``, to spread the decoding
+        of large result sets over several cores.  Chunks of BSON documents
+        are sent to the workers, which return unwrapped documents that are
+        then bound to this session.  Combine with :func:`raw_bson` to skip
+        decoding the results in this process.  The document classes must be
+        importable by the workers.
+
+        :param executor: the process pool to unwrap the documents with
+        :param chunk_size: the number of documents sent to a worker at once
+        :param max_pending: the number of chunks sent ahead of the ones \
+                being read
+        :param as_dicts: return dicts of the set field values (by attribute \
+                name) instead of documents
+        """
+        self._process_pool = (executor, chunk_size, max_pending, as_dicts)
+        return self
+
+    def prefetch(self, *qfields):
+        """Eagerly load the documents referenced by the ``RefField``,
+        ``SRefField`` (or list of references) fields ``qfields``.  Once the
+        query is iterated, the references of the whole result set are loaded
+        with one query per referenced collection and stored in the session
+        cache, so that accessing them through ``rel()`` proxies doesn't hit
+        the database.  Requires the session cache to be enabled
+        (``cache_size`` other than ``0``), or the second level cache for the
+        referenced classes, and warns otherwise.  The references are loaded
+        one batch of results at a time (see :func:`batch_size`).
+        """
+        for qfield in qfields:
+            field, ref_field = self._reference_field(qfield)
+            if self.session.cache_size == 0 and not (
+                self.session._uses_second_level_cache(ref_field.ref_type)
+            ):
+                warnings.warn(
+                    "Prefetching %s has no effect: the session cache is "
+                    "disabled (cache_size=0)" % field._name,
+                    RuntimeWarning,
+                    stacklevel=2,
+                )
+            if field not in self._prefetch:
+                self._prefetch.append(field)
+        return self
+
+    def lookup(self, *qfields):
+        """Join the documents referenced by ``qfields`` on the server.  The
+        query is run as an aggregation pipeline with one ``$lookup`` stage
+        per field, and the joined documents are unwrapped with the referenced
+        document class into the session cache, like :func:`prefetch` does.
+        References must be typed and point to the session's database.
+        """
+        for qfield in qfields:
+            field, ref_field = self._reference_field(qfield)
+            if ref_field.ref_type is None:
+                raise BadQueryException(
+                    "Cannot lookup untyped reference field %s" % field._name
+                )
+            if ref_field.db is not None:
+                raise BadQueryException(
+                    "Cannot lookup cross-database reference field %s" % field._name
+                )
+            if field not in self._lookups:
+                self._lookups.append(field)
+        return self
+
+    def _reference_field(self, qfield):
+        qfield = _resolve_name(self.type, qfield)
+        field = qfield
+        if not isinstance(field, RefBase) and hasattr(qfield, "get_type"):
+            field = qfield.get_type()
+        if isinstance(field, SequenceField):
+            ref_field = field.item_type
+        else:
+            ref_field = field
+        if not isinstance(ref_field, RefBase):
+            raise BadQueryException(
+                "%s is not a reference field" % getattr(field, "_name", field)
+            )
+        return field, ref_field
+
+    def _lookup_specs(self):
+        """Returns ``(field, alias, id_alias, type)`` for each looked up
+        field. ``alias`` receives the joined documents and ``id_alias`` (for
+        ``DBRef`` fields) the referenced ids"""
+        specs = []
+        for field in self._lookups:
+            ref_field = field
+            if isinstance(field, SequenceField):
+                ref_field = field.item_type
+            alias = "_lookup_%s" % field.db_field
+            id_alias = None
+            if isinstance(ref_field, RefField):
+                id_alias = alias + "_id"
+            specs.append((field, alias, id_alias, ref_field.ref_type))
+        return specs
+
+    def _pipeline(self):
+        """Compiles this query into an aggregation pipeline with a
+        ``$lookup`` stage for each field passed to :func:`lookup`"""
+        pipeline = [{"$match": self.query}]
+        sort = self._sort or self.type.config_default_sort
+        if sort:
+            pipeline.append({"$sort": SON(sort)})
+        if self._get_skip() is not None:
+            pipeline.append({"$skip": self._get_skip()})
+        if self._get_limit() is not None:
+            pipeline.append({"$limit": self._get_limit()})
+
+        aliases = []
+        for field, alias, id_alias, type in self._lookup_specs():
+            local_field = field.db_field
+            if id_alias is not None:
+                if isinstance(field, SequenceField):
+                    ids = {
+                        "$map": {
+                            "input": "$" + local_field,
+                            "as": "ref",
+                            "in": _dbref_id("$$ref"),
+                        }
+                    }
+                else:
+                    ids = _dbref_id("$" + local_field)
+                pipeline.append({"$addFields": {id_alias: ids}})
+                local_field = id_alias
+                aliases.append(id_alias)
+            pipeline.append(
+                {
+                    "$lookup": {
+                        "from": type.get_collection_name(),
+                        "localField": local_field,
+                        "foreignField": "_id",
+                        "as": alias,
+                    }
+                }
+            )
+            aliases.append(alias)
+
+        if self._get_fields():
+            projection = self._fields_expression()
+            if all(value is not False for value in projection.values()):
+                projection.update((alias, True) for alias in aliases)
+            pipeline.append({"$project": projection})
+        return pipeline
+
     def _get_fields(self):
         return self._fields
 
@@ -52,17 +289,218 @@ class Query:
         self._skip = skip
         return self
 
+    def batch_size(self, batch_size):
+        """Sets the number of documents the server returns per batch"""
+        self._batch_size = batch_size
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        """Aborts the query on the server if it runs for longer than
+        ``max_time_ms`` milliseconds"""
+        self._max_time_ms = max_time_ms
+        return self
+
+    def iter_batches(self, size):
+        """Yields the results as lists of at most ``size`` documents,
+        fetching ``size`` documents per server batch.  Only one batch is held
+        in memory at a time, and references given to :func:`prefetch` are
+        loaded once per batch.
+
+        :param size: the number of documents per list
+        """
+        query = self.clone()
+        if query._batch_size is None:
+            query._batch_size = size
+        return query.__get_query_result().iter_batches(size)
+
     def clone(self):
         qclone = Query(self.type, self.session)
         qclone.__query = deepcopy(self.__query)
+        qclone.__compiled = self.__compiled
+        qclone.__compiled_fields = self.__compiled_fields
         qclone._sort = deepcopy(self._sort)
         qclone._fields = deepcopy(self._fields)
         qclone.hints = deepcopy(self.hints)
         qclone._limit = deepcopy(self._limit)
         qclone._skip = deepcopy(self._skip)
+        qclone._batch_size = self._batch_size
+        qclone._max_time_ms = self._max_time_ms
         qclone._raw_output = deepcopy(self._raw_output)
+        qclone._trusted = self._trusted
+        qclone._lazy = self._lazy
+        qclone._raw_bson = self._raw_bson
+        qclone._prefetch = list(self._prefetch)
+        qclone._lookups = list(self._lookups)
+        qclone._process_pool = self._process_pool
         return qclone
 
+    def paginate_after(self, after=None, page_size=20):
+        """Returns a page of at most ``page_size`` results following
+        ``after``, as a ``(documents, token)`` tuple.  ``token`` is ``None``
+        on the last page; otherwise pass it (or the last document of the
+        page) as ``after`` to get the next page.
+
+        Instead of skipping over the previous pages, this filters on the
+        values of the sort fields of the last document, with ``_id`` added
+        as a tiebreaker, so every page costs the same given a matching index.
+        The sort fields must be set on every document.
+
+        :param after: ``None`` for the first page, a token returned by a \
+                previous call or the last document of the previous page
+        :param page_size: the maximum number of documents in the page
+        """
+        sort = list(self._sort or self.type.config_default_sort or [])
+        if not any(name == "_id" for name, _ in sort):
+            direction = sort[-1][1] if sort else ASCENDING
+            sort.append(("_id", direction))
+
+        query = self.clone()
+        query._sort = sort
+        query._skip = None
+        query._limit = page_size + 1
+        if after is not None:
+            if isinstance(after, str):
+                values = _decode_token(after, sort)
+            else:
+                wrapped = after if isinstance(after, dict) else after.wrap()
+                values = [_sort_value(wrapped, name) for name, _ in sort]
+            query.__add_condition(_keyset_filter(sort, values))
+
+        documents = query.all()
+        if len(documents) <= page_size:
+            return documents, None
+        documents = documents[:page_size]
+        last = documents[-1]
+        wrapped = last if isinstance(last, dict) else last.wrap()
+        return documents, _encode_token(
+            sort, [_sort_value(wrapped, name) for name, _ in sort]
+        )
+
+    def parallel_iter(self, workers=4, ordered=False, batch_size=100):
+        """Scans the results with ``workers`` cursors in parallel, each one
+        reading a disjoint ``_id`` range on a thread pool, and yields the
+        unwrapped documents.  The filter, projection and loading options of
+        the query are kept; its sort order is not.
+
+        The range boundaries are picked from a ``$sample`` of the matching
+        ``_id`` values, so the ranges hold about as many documents each.
+        Range conditions only match ``_id`` values of the sampled BSON type,
+        so the documents with other ``_id`` types are read by one more
+        cursor (and come last when ``ordered``).
+
+        :param workers: the number of ranges and threads
+        :param ordered: yield the documents in ``_id`` order instead of as \
+                they arrive
+        :param batch_size: the number of documents a worker unwraps before \
+                handing them over
+        """
+        if self._limit is not None or self._skip is not None:
+            raise BadQueryException("Can't split a query with a limit or skip")
+        if self._lookups:
+            raise BadQueryException("Can't split a query using lookup()")
+        if self.session.client_session is not None:
+            raise BadQueryException("Can't scan in parallel in a native transaction")
+
+        points, id_type = self._split_points(workers)
+        bounds = [None] + points + [None]
+        conditions = []
+        for low, high in zip(bounds, bounds[1:]):
+            condition = {}
+            if low is not None:
+                condition["$gte"] = low
+            if high is not None:
+                condition["$lt"] = high
+            conditions.append(condition)
+        if points:
+            conditions.append({"$not": {"$type": id_type}})
+
+        ranges = []
+        for condition in conditions:
+            query = self.clone().raw_output()
+            query._sort = [("_id", ASCENDING)] if ordered else []
+            query._prefetch = []
+            if condition:
+                query.__add_condition({"_id": condition})
+            ranges.append(query)
+        return self.__scan(ranges, ordered, batch_size)
+
+    def _split_points(self, count):
+        """Returns up to ``count - 1`` sorted ``_id`` values splitting the
+        results in ranges of about the same size, and the ``$type`` alias of
+        these values"""
+        if count < 2:
+            return [], None
+        collection = self.session.db[self.type.get_collection_name()]
+        sample = collection.aggregate(
+            [
+                {"$match": self.query},
+                {"$sample": {"size": count * 32}},
+                {"$project": {"_id": 1}},
+            ]
+        )
+        try:
+            ids = sorted({value["_id"] for value in sample})
+        except TypeError:
+            # _id values of different types, scan with a single cursor
+            return [], None
+        id_types = {_bson_type(_id) for _id in ids}
+        if len(id_types) != 1 or None in id_types:
+            return [], None
+        points = sorted({ids[len(ids) * i // count] for i in range(1, count)})
+        return points, id_types.pop()
+
+    def __scan(self, ranges, ordered, batch_size):
+        session = self.session
+        unwrap = None
+        if not self._raw_output:
+
+            def unwrap(value):
+                return session._unwrap(
+                    self.type,
+                    value,
+                    fields=self._get_fields(),
+                    trusted=self._trusted,
+                    lazy=self._lazy,
+                )
+
+        if ordered:
+            queues = [queue.Queue(maxsize=2) for _ in ranges]
+        else:
+            queues = [queue.Queue(maxsize=2 * len(ranges))] * len(ranges)
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=len(ranges))
+        try:
+            for range_query, out in zip(ranges, queues):
+                executor.submit(_scan_range, range_query, out, stop, batch_size, unwrap)
+
+            pending = len(ranges)
+            current = 0
+            while pending:
+                batch = queues[current].get()
+                if batch is _SCAN_DONE:
+                    pending -= 1
+                    if ordered:
+                        current += 1
+                    continue
+                if isinstance(batch, Exception):
+                    raise batch
+                if unwrap is not None:
+                    batch = [self.__cached(obj) for obj in batch]
+                    if self._prefetch:
+                        session.prefetch(batch, self._prefetch)
+                for obj in batch:
+                    yield obj
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def __cached(self, obj):
+        cached = self.session.cache_read(obj.mongo_id)
+        if cached:
+            return cached
+        self.session.cache_write(obj)
+        return obj
+
     def one(self):
         iterator = iter(self)
         try:
@@ -102,7 +540,7 @@ class Query:
         return self.__hint(qfield, DESCENDING)
 
     def __hint(self, qfield, direction):
-        qfield = resolve_name(self.type, qfield)
+        qfield = _resolve_name(self.type, qfield)
         name = str(qfield)
         for n, _ in self.hints:
             if n == name:
@@ -129,35 +567,55 @@ class Query:
 
     def filter_by(self, **filters):
         for name, value in filters.items():
-            self.filter(resolve_name(self.type, name) == value)
+            self.filter(_resolve_name(self.type, name) == value)
         return self
 
-    def count(self, with_limit_and_skip=False):
-        return self.__get_query_result().cursor.count(
-            with_limit_and_skip=with_limit_and_skip
+    def count(self, with_limit_and_skip=False, cache_ttl=None):
+        """Counts the matching documents with ``count_documents``, applying
+        the hints and :func:`max_time_ms` of the query.
+
+        :param with_limit_and_skip: apply the limit and skip of the query
+        :param cache_ttl: if set, reuse a count of the same query made by \
+                any session of the engine in the last ``cache_ttl`` seconds
+        """
+        return self.session.execute_count(
+            self, with_limit_and_skip=with_limit_and_skip, cache_ttl=cache_ttl
         )
 
+    def estimated_count(self):
+        """Returns the number of documents in the collection from its
+        metadata, without scanning it.  Only works for queries without a
+        filter."""
+        if self.query:
+            raise BadQueryException("estimated_count() can't apply a filter")
+        return self.session.execute_estimated_count(self)
+
     def fields(self, *fields):
         if self._fields is None:
             self._fields = set()
         for f in fields:
-            f = resolve_name(self.type, f)
+            f = _resolve_name(self.type, f)
             self._fields.add(f)
         self._fields.add(self.type.mongo_id)
+        self.__compiled_fields = None
         return self
 
     def _fields_expression(self):
-        fields = {}
-        for f in self._get_fields():
-            fields[f.get_absolute_name()] = f.fields_expression
-        return fields
+        # a copy, since the memoized projection is shared with the clones
+        if self.__compiled_fields is None:
+            fields = {}
+            for f in self._get_fields():
+                fields[f.get_absolute_name()] = f.fields_expression
+            self.__compiled_fields = fields
+        return dict(self.__compiled_fields)
 
     def _apply(self, qe):
         self._apply_dict(qe.obj)
 
     def _apply_dict(self, qe_dict):
+        self.__compiled = None
         for k, v in qe_dict.items():
-            k = resolve_name(self.type, k)
+            k = _resolve_name(self.type, k)
             if k not in self.__query:
                 self.__query[k] = v
                 continue
@@ -176,7 +634,7 @@ class Query:
     def sort(self, *sort_tuples):
         query = self
         for name, direction in sort_tuples:
-            field = resolve_name(self.type, name)
+            field = _resolve_name(self.type, name)
             if direction in (ASCENDING, 1):
                 query = query.ascending(field)
             elif direction in (DESCENDING, -1):
@@ -186,7 +644,7 @@ class Query:
         return query
 
     def __sort(self, qfield, direction):
-        qfield = resolve_name(self.type, qfield)
+        qfield = _resolve_name(self.type, qfield)
         name = str(qfield)
         for n, _ in self._sort:
             if n == name:
@@ -207,7 +665,7 @@ class Query:
         return self
 
     def in_(self, qfield, *values):
-        qfield = resolve_name(self.type, qfield)
+        qfield = _resolve_name(self.type, qfield)
         self.filter(
             QueryExpression(
                 {qfield: {"$in": [qfield.wrap_value(value) for value in values]}}
@@ -216,7 +674,7 @@ class Query:
         return self
 
     def nin(self, qfield, *values):
-        qfield = resolve_name(self.type, qfield)
+        qfield = _resolve_name(self.type, qfield)
         self.filter(
             QueryExpression(
                 {qfield: {"$nin": [qfield.wrap_value(value) for value in values]}}
@@ -258,28 +716,268 @@ class Query:
         return UpdateExpression(self).pop_last(qfield)
 
 
+def _unwrap_chunk(type, chunk, fields, trusted, as_dicts):
+    """Unwraps a chunk of BSON encoded documents in a worker process"""
+    documents = []
+    for data in chunk:
+        obj = type.transform_incoming(bson.decode(data), session=None)
+        obj = type.unwrap(obj, fields=fields, trusted=trusted)
+        if as_dicts:
+            obj = {name: v.value for name, v in obj._values.items() if v.set}
+        documents.append(obj)
+    return documents
+
+
+_SCAN_DONE = object()
+
+
+def _bson_type(value):
+    """Returns the ``$type`` alias of the values a range condition on
+    ``value`` can match, or ``None`` if unsupported"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Int64, Decimal128)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    return None
+
+
+def _put(out, item, stop):
+    """Puts ``item`` on the ``out`` queue unless the scan was stopped"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _scan_range(query, out, stop, batch_size, unwrap):
+    """Reads the results of ``query`` and puts them on ``out`` in batches
+    of ``batch_size``, followed by ``_SCAN_DONE``"""
+    try:
+        batch = []
+        for value in query:
+            batch.append(value if unwrap is None else unwrap(value))
+            if len(batch) >= batch_size:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+        if batch and not _put(out, batch, stop):
+            return
+    except Exception as exc:
+        if not _put(out, exc, stop):
+            return
+    _put(out, _SCAN_DONE, stop)
+
+
+def _sort_value(wrapped, name):
+    value = wrapped
+    for part in name.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _keyset_filter(sort, values):
+    """Matches the documents which come after ``values`` in the order given
+    by ``sort``"""
+    clauses = []
+    for i, (name, direction) in enumerate(sort):
+        clause = {n: v for (n, _), v in zip(sort[:i], values)}
+        op = "$gt" if direction in (ASCENDING, 1) else "$lt"
+        clause[name] = {op: values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def _encode_token(sort, values):
+    data = bson.encode({"sort": [list(s) for s in sort], "values": values})
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _decode_token(token, sort):
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise BadQueryException("Invalid pagination token")
+    if [tuple(s) for s in data.get("sort", [])] != [tuple(s) for s in sort]:
+        raise BadQueryException("Pagination token is for a different sort order")
+    return data["values"]
+
+
+def _dbref_id(expression):
+    """Aggregation expression extracting the ``$id`` of the ``DBRef``
+    ``expression`` (``$id`` can't be used in a field path)"""
+    return {
+        "$arrayElemAt": [
+            {"$map": {"input": {"$objectToArray": expression}, "in": "$$this.v"}},
+            1,
+        ]
+    }
+
+
 class QueryResult:
-    def __init__(self, session, cursor, type, raw_output=False, fields=None):
+    #: number of results whose references are prefetched at once, unless a
+    #: batch size is set
+    prefetch_batch_size = 100
+
+    def __init__(
+        self,
+        session,
+        cursor,
+        type,
+        raw_output=False,
+        fields=None,
+        trusted=False,
+        lazy=False,
+        prefetch=None,
+        lookups=None,
+        batch_size=None,
+        max_time_ms=None,
+        process_pool=None,
+    ):
         self.cursor = cursor
         self.type = type
         self.fields = fields
         self.raw_output = raw_output
+        self.trusted = trusted
+        self.lazy = lazy
+        self.prefetch = prefetch or []
+        self.lookups = lookups or []
+        self.batch_size = batch_size
+        self.max_time_ms = max_time_ms
+        self.process_pool = process_pool
         self.session = session
+        self.__prefetched = None
+        self.__pending = deque()
+        self.__exhausted = False
 
     def next(self):
+        if self.process_pool and not self.raw_output:
+            return self._next_pooled()
+        if self.prefetch and not self.raw_output:
+            return self._next_prefetched()
         return self._next_internal()
 
     __next__ = next
 
+    def _next_prefetched(self):
+        if self.__prefetched is None:
+            self.__prefetched = deque()
+        if not self.__prefetched:
+            batch = []
+            try:
+                while len(batch) < (self.batch_size or self.prefetch_batch_size):
+                    batch.append(self._next_internal())
+            except StopIteration:
+                pass
+            if not batch:
+                raise StopIteration
+            self.session.prefetch(batch, self.prefetch)
+            self.__prefetched.extend(batch)
+        return self.__prefetched.popleft()
+
+    def _next_pooled(self):
+        if self.__prefetched is None:
+            self.__prefetched = deque()
+        while not self.__prefetched:
+            self._submit_chunks()
+            if not self.__pending:
+                raise StopIteration
+            documents = self.__pending.popleft().result()
+            self.__prefetched.extend(self._bind_pooled(documents))
+        return self.__prefetched.popleft()
+
+    def _submit_chunks(self):
+        """Sends chunks of raw documents to the process pool until
+        ``max_pending`` chunks are being unwrapped"""
+        executor, chunk_size, max_pending, as_dicts = self.process_pool
+        trusted = self.trusted or not self.session.validate_on_load
+        fields = [str(f) for f in self.fields] if self.fields else None
+        while not self.__exhausted and len(self.__pending) < max_pending:
+            chunk = []
+            for value in self.cursor:
+                if self.lookups:
+                    if isinstance(value, RawBSONDocument):
+                        value = dict(value.items())
+                    self._load_lookups(value)
+                if isinstance(value, RawBSONDocument):
+                    chunk.append(value.raw)
+                else:
+                    chunk.append(bson.encode(value))
+                if len(chunk) >= chunk_size:
+                    break
+            else:
+                self.__exhausted = True
+            if chunk:
+                self.__pending.append(
+                    executor.submit(
+                        _unwrap_chunk, self.type, chunk, fields, trusted, as_dicts
+                    )
+                )
+
+    def _bind_pooled(self, documents):
+        """Replaces the documents unwrapped by the process pool with the
+        cached ones, or binds them to the session"""
+        if self.process_pool[3]:
+            return documents
+        result = []
+        for obj in documents:
+            cached = self.session.cache_read(obj.mongo_id)
+            if cached:
+                result.append(cached)
+                continue
+            obj._session = self.session
+            self.session.cache_write(obj)
+            result.append(obj)
+        if self.prefetch:
+            self.session.prefetch(result, self.prefetch)
+        return result
+
+    def iter_batches(self, size):
+        """Yields the remaining results as lists of at most ``size``
+        documents"""
+        if size < 1:
+            raise BadQueryException("Batch size must be positive: %r" % (size,))
+        prefetch = self.prefetch and not self.raw_output
+        while True:
+            batch = []
+            try:
+                while len(batch) < size:
+                    batch.append(self._next_internal())
+            except StopIteration:
+                pass
+            if not batch:
+                return
+            if prefetch:
+                self.session.prefetch(batch, self.prefetch)
+            yield batch
+            if len(batch) < size:
+                return
+
     def _next_internal(self):
         value = next(self.cursor)
         if not self.raw_output:
-            db = self.cursor.collection.database
-            conn = db.connection
+            if self.lookups:
+                if isinstance(value, RawBSONDocument):
+                    value = dict(value.items())
+                self._load_lookups(value)
             obj = self.session.cache_read(value["_id"])
             if obj:
                 return obj
-            value = self.session._unwrap(self.type, value, fields=self.fields)
+            value = self.session._unwrap(
+                self.type,
+                value,
+                fields=self.fields,
+                trusted=self.trusted,
+                lazy=self.lazy,
+            )
             if not isinstance(value, dict):
                 self.session.cache_write(value)
         return value
@@ -287,25 +985,48 @@ class QueryResult:
     def __getitem__(self, index):
         value = self.cursor.__getitem__(index)
         if not self.raw_output:
-            db = self.cursor.collection.database
-            conn = db.connection
             obj = self.session.cache_read(value["_id"])
             if obj:
                 return obj
-            value = self.session._unwrap(self.type, value)
+            value = self.session._unwrap(
+                self.type, value, trusted=self.trusted, lazy=self.lazy
+            )
             self.session.cache_write(value)
         return value
 
+    def _load_lookups(self, value):
+        """Moves the documents joined by ``$lookup`` stages out of ``value``
+        and into the session cache"""
+        for field, alias, id_alias, type in self.lookups:
+            if id_alias is not None:
+                value.pop(id_alias, None)
+            for joined in value.pop(alias, []):
+                if self.session.cache_read(joined["_id"]) is None:
+                    obj = self.session._unwrap(type, joined, trusted=self.trusted)
+                    self.session.cache_write(obj)
+
     def rewind(self):
         return self.cursor.rewind()
 
     def clone(self):
+        cursor = self.cursor.clone()
+        if self.batch_size is not None:
+            cursor.batch_size(self.batch_size)
+        if self.max_time_ms is not None:
+            cursor.max_time_ms(self.max_time_ms)
         return QueryResult(
             self.session,
-            self.cursor.clone(),
+            cursor,
             self.type,
             raw_output=self.raw_output,
             fields=self.fields,
+            trusted=self.trusted,
+            lazy=self.lazy,
+            prefetch=self.prefetch,
+            lookups=self.lookups,
+            batch_size=self.batch_size,
+            max_time_ms=self.max_time_ms,
+            process_pool=self.process_pool,
         )
 
     def __iter__(self):
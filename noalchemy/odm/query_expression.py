@@ -72,6 +72,7 @@ class QueryField:
         self.__type = type
         self.__parent = parent
         self.__cached_id_value = None
+        self.__absolute_name = None
         self.__matched_index = False
         self.__fields_expr = True
 
@@ -93,9 +94,16 @@ class QueryField:
 
     def matched_index(self):
         self.__matched_index = True
+        self.__absolute_name = None
+        return self
+
+    def __deepcopy__(self, memo):
+        # query fields are shared between the clones of a query
         return self
 
     def __getattr__(self, name):
+        if name.startswith("_QueryField__"):
+            raise AttributeError(name)
         if not self.__type.no_real_attributes and hasattr(self.__type, name):
             return getattr(self.__type, name)
 
@@ -110,6 +118,11 @@ class QueryField:
         return QueryField(fields[name], parent=self)
 
     def get_absolute_name(self):
+        if self.__absolute_name is None:
+            self.__absolute_name = self.__build_absolute_name()
+        return self.__absolute_name
+
+    def __build_absolute_name(self):
         res = []
         current = self
 
@@ -1,29 +1,39 @@
 import threading
 from uuid import uuid4
 
-from bson import ObjectId
+import bson
+from bson import SON, ObjectId
+from bson.raw_bson import RawBSONDocument
 from pymongo import MongoClient
-
-from ..exc import BadReferenceException, TransactionException
-from .document import Document, collection_registry
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from ..exc import (BadReferenceException, DuplicateDocumentException,
+                   FieldNotRetrieved, TransactionException)
+from ..fields import RefBase
+from .aggregate import Aggregation
+from .cache import create_cache
+from .document import (Document, collection_registry, ensure_indexes,
+                       invalidate_indexes)
 from .ops import *
 from .query import Query, QueryResult, RemoveQuery
 from .query_expression import FreeFormDoc
+from .transaction import MockClientSession
 
 
 class sessionmaker:
-    def __init__(self, bind=None):
+    def __init__(self, bind=None, **kwargs):
         self.bind = bind
+        self.kwargs = kwargs
 
     def __call__(self):
         if self.bind:
-            return Session(self.bind)
+            return Session(self.bind, **self.kwargs)
         else:
             raise ValueError("No bind provided for sessionmaker")
 
     def __enter__(self):
         if self.bind:
-            return Session(self.bind)
+            return Session(self.bind, **self.kwargs)
         else:
             raise ValueError("No bind provided for sessionmaker")
 
@@ -56,13 +66,24 @@ class scoped_session:
 
 
 class Session:
-    def __init__(self, engine):
+    #: maximum number of new documents sent in one ``insert_many`` call
+    insert_chunk_size = 1000
+
+    def __init__(
+        self, engine, validate_on_load=True, weak_identity_map=False, lazy_load=False
+    ):
         self.engine = engine
 
         self.auto_ensure = True
+        self.validate_on_load = validate_on_load
+        self.lazy_load = lazy_load
+        self.weak_identity_map = weak_identity_map
         self.queue = []
-        self.cache = {}
         self.transactions = []
+        # transaction id -> id of the transaction it is nested in
+        self._trans_parents = {}
+        self._client_session = None
+        self._flushed = []
 
         self.__post_init__()
 
@@ -71,8 +92,14 @@ class Session:
         self.safe = self.engine.safe
         self.timezone = self.engine.timezone
         self.cache_size = self.engine.cache_size
+        self.cache_policy = self.engine.cache_policy
+        if self.weak_identity_map:
+            self.cache_policy = "weak"
+        self.cache = create_cache(self.cache_policy, self.cache_size)
+        self.second_level_cache = self.engine.second_level_cache
         self.tz_aware = self.engine.tz_aware
         self._autocommit = self.engine.autocommit
+        self.native_transactions = self.engine.native_transactions
 
     @property
     def autocommit(self):
@@ -82,6 +109,18 @@ class Session:
     def in_transaction(self):
         return bool(self.transactions)
 
+    @property
+    def client_session(self):
+        """The pymongo ``ClientSession`` backing the open native transaction,
+        or ``None``"""
+        return self._client_session
+
+    def _session_kwargs(self):
+        # mongomock doesn't take sessions, its stand-in works on the side
+        if self._client_session is None or self.engine.mock:
+            return {}
+        return {"session": self._client_session}
+
     def cache_write(self, obj, mongo_id=None):
         if mongo_id is None:
             mongo_id = obj.mongo_id
@@ -89,14 +128,11 @@ class Session:
         if self.cache_size == 0:
             return
         if mongo_id not in self.cache:
-            if self.cache_size is not None and len(self.cache) >= self.cache_size:
-                key_to_delete = next(iter(self.cache))
-                del self.cache[key_to_delete]
             assert isinstance(mongo_id, ObjectId), (
                 "Currently, cached objects must use mongo_id as an ObjectId.  Got: %s"
                 % type(mongo_id)
             )
-            self.cache[mongo_id] = obj
+            self.cache.put(mongo_id, obj)
 
     def cache_read(self, id):
         if self.cache_size == 0:
@@ -104,12 +140,10 @@ class Session:
         assert isinstance(
             id, ObjectId
         ), "Currently, cached objects must use mongo_id as an ObjectId"
-        if id in self.cache:
-            return self.cache[id]
-        return None
+        return self.cache.get(id)
 
     def close(self):
-        self.cache = {}
+        self.cache.clear()
         if self.transactions:
             raise TransactionException(
                 "Tried to close session with an open " "transaction"
@@ -150,17 +184,34 @@ class Session:
             type = FreeFormDoc(type)
         return Query(type, self, exclude_subclasses=exclude_subclasses)
 
+    def aggregate(self, type, exclude_subclasses=False):
+        """Returns an :class:`~noalchemy.odm.aggregate.Aggregation` on the
+        collection of ``type``"""
+        if isinstance(type, str):
+            type = FreeFormDoc(type)
+        return Aggregation(type, self, exclude_subclasses=exclude_subclasses)
+
     def add_to_session(self, obj):
         obj._set_session(self)
 
     def execute_query(self, query, session):
         self.auto_ensure_indexes(query.type)
 
+        collection = self.db[query.type.get_collection_name()]
+        if query._raw_bson:
+            collection = collection.with_options(
+                codec_options=collection.codec_options.with_options(
+                    document_class=RawBSONDocument
+                )
+            )
+        if query._lookups:
+            return self._execute_lookup_query(query, session, collection)
+
         kwargs = dict()
         if query._get_fields():
             kwargs["projection"] = query._fields_expression()
 
-        collection = self.db[query.type.get_collection_name()]
+        kwargs.update(self._session_kwargs())
         cursor = collection.find(query.query, **kwargs)
 
         if query._sort:
@@ -173,14 +224,110 @@ class Session:
             cursor.limit(query._get_limit())
         if query._get_skip() is not None:
             cursor.skip(query._get_skip())
+        if query._batch_size is not None:
+            cursor.batch_size(query._batch_size)
+        if query._max_time_ms is not None:
+            cursor.max_time_ms(query._max_time_ms)
         return QueryResult(
             session,
             cursor,
             query.type,
             raw_output=query._raw_output,
             fields=query._get_fields(),
+            trusted=query._trusted,
+            lazy=query._lazy,
+            prefetch=query._prefetch,
+            batch_size=query._batch_size,
+            max_time_ms=query._max_time_ms,
+            process_pool=query._process_pool,
         )
 
+    def _execute_lookup_query(self, query, session, collection):
+        for spec in query._lookup_specs():
+            self.auto_ensure_indexes(spec[3])
+
+        kwargs = dict()
+        if query.hints:
+            kwargs["hint"] = SON(query.hints)
+        if query._batch_size is not None:
+            kwargs["batchSize"] = query._batch_size
+        if query._max_time_ms is not None:
+            kwargs["maxTimeMS"] = query._max_time_ms
+        kwargs.update(self._session_kwargs())
+        cursor = collection.aggregate(query._pipeline(), **kwargs)
+        return QueryResult(
+            session,
+            cursor,
+            query.type,
+            raw_output=query._raw_output,
+            fields=query._get_fields(),
+            trusted=query._trusted,
+            lazy=query._lazy,
+            prefetch=query._prefetch,
+            lookups=query._lookup_specs(),
+            process_pool=query._process_pool,
+        )
+
+    def execute_aggregation(self, aggregation):
+        self.auto_ensure_indexes(aggregation.type)
+        collection = self.db[aggregation.type.get_collection_name()]
+        kwargs = dict()
+        if aggregation._allow_disk_use:
+            kwargs["allowDiskUse"] = True
+        if aggregation._batch_size is not None:
+            kwargs["batchSize"] = aggregation._batch_size
+        if aggregation._max_time_ms is not None:
+            kwargs["maxTimeMS"] = aggregation._max_time_ms
+        kwargs.update(self._session_kwargs())
+        cursor = collection.aggregate(aggregation.pipeline(), **kwargs)
+        result_type = aggregation._result_type
+        return QueryResult(
+            self,
+            cursor,
+            result_type or aggregation.type,
+            raw_output=result_type is None,
+        )
+
+    def execute_count(self, query, with_limit_and_skip=False, cache_ttl=None):
+        self.auto_ensure_indexes(query.type)
+        collection = self.db[query.type.get_collection_name()]
+        kwargs = dict()
+        if with_limit_and_skip:
+            if query._get_limit():
+                kwargs["limit"] = query._get_limit()
+            if query._get_skip():
+                kwargs["skip"] = query._get_skip()
+        if query.hints:
+            kwargs["hint"] = list(query.hints)
+        if query._max_time_ms is not None:
+            kwargs["maxTimeMS"] = query._max_time_ms
+
+        key = None
+        # counts seen by a native transaction may include its own writes
+        if cache_ttl and self._client_session is None:
+            key = (
+                self.db.name,
+                collection.name,
+                bson.encode(query.query),
+                tuple(sorted(kwargs.items())),
+            )
+            count = self.engine.count_cache.get(key)
+            if count is not None:
+                return count
+        count = collection.count_documents(
+            query.query, **kwargs, **self._session_kwargs()
+        )
+        if key is not None:
+            self.engine.count_cache.put(key, count, cache_ttl)
+        return count
+
+    def execute_estimated_count(self, query):
+        collection = self.db[query.type.get_collection_name()]
+        kwargs = dict()
+        if query._max_time_ms is not None:
+            kwargs["maxTimeMS"] = query._max_time_ms
+        return collection.estimated_document_count(**kwargs)
+
     def remove_query(self, type):
         return RemoveQuery(type, self)
 
@@ -233,7 +380,10 @@ class Session:
         if fm_exp._get_remove():
             kwargs["remove"] = fm_exp._get_remove()
 
-        value = collection.find_one_and_update(**kwargs)
+        try:
+            value = collection.find_one_and_update(**kwargs)
+        finally:
+            self.invalidate_second_level_cache(fm_exp.query.type)
 
         if value is None:
             return None
@@ -247,8 +397,12 @@ class Session:
             self.cache_write(obj)
         return obj
 
-    def _unwrap(self, type, obj, **kwargs):
+    def _unwrap(self, type, obj, trusted=False, lazy=False, **kwargs):
         obj = type.transform_incoming(obj, session=self)
+        if trusted or not self.validate_on_load:
+            kwargs["trusted"] = True
+        if lazy or self.lazy_load:
+            kwargs["lazy"] = True
         return type.unwrap(obj, session=self, **kwargs)
 
     @property
@@ -262,8 +416,16 @@ class Session:
 
     def ensure_indexes(self, cls):
         collection = self.db[cls.get_collection_name()]
-        for index in cls.get_indexes():
-            index.ensure(collection)
+        ensure_indexes(collection, cls.get_indexes())
+
+    def invalidate_indexes(self, *classes):
+        """Forgets the indexes ensured for ``classes`` (or for every
+        collection when no class is given) so they are created again on the
+        next operation"""
+        if not classes:
+            invalidate_indexes()
+        for cls in classes:
+            invalidate_indexes(self.db[cls.get_collection_name()])
 
     def auto_ensure_indexes(self, cls):
         if self.auto_ensure:
@@ -276,13 +438,25 @@ class Session:
             self.queue = []
             return
 
-        for index, op in enumerate(self.queue):
-            if op.trans_id == trans_id:
-                break
-        self.queue = self.queue[:index]
+        index = self._first_op_of(self.queue, trans_id)
+        if index is not None:
+            self.queue = self.queue[:index]
+
+    def _first_op_of(self, ops, trans_id):
+        """Returns the index of the first of ``ops`` queued in the
+        transaction ``trans_id`` or in a transaction nested in it, or
+        ``None``.  The operations which follow it were all queued in one of
+        these transactions"""
+        for index, op in enumerate(ops):
+            op_trans_id = op.trans_id
+            while op_trans_id is not None:
+                if op_trans_id == trans_id:
+                    return index
+                op_trans_id = self._trans_parents.get(op_trans_id)
+        return None
 
     def clear_cache(self):
-        self.cache = {}
+        self.cache.clear()
 
     def clear_collection(self, *classes):
         for c in classes:
@@ -291,43 +465,291 @@ class Session:
             self.commit()
 
     def commit(self, safe=None):
-        result = None
-        for index, op in enumerate(self.queue):
+        """Writes the queued operations.  Inside a native transaction this
+        is :func:`flush`: the writes are committed with the transaction"""
+        if self._client_session is not None:
+            return self.flush()
+        try:
+            result = self._execute_queue(self.queue)
+        except:
+            self.clear_queue()
+            self.clear_cache()
+            raise
+        self.clear_queue()
+        return result
+
+    def _execute_queue(self, queue):
+        result = CommitResult()
+        batches = self._group_queue(queue)
+        for index, ops in enumerate(batches):
+            ops, merged = coalesce(ops)
+            result.coalesced.extend(merged)
             try:
-                result = op.execute()
-            except:
-                self.clear_queue()
-                self.clear_cache()
+                self._execute_batch(ops, result)
+            except Exception as e:
+                # the write errors record which operations were applied
+                written = isinstance(e, (BulkWriteError, DuplicateDocumentException))
+                result.add_unsent(ops, applied=False if written else None)
+                for later in batches[index + 1 :]:
+                    result.add_unsent(later)
+                e.commit_result = result
                 raise
-        self.clear_queue()
         return result
 
-    def dereference(self, ref, allow_none=False):
+    def _group_queue(self, queue):
+        """Splits ``queue`` into runs of consecutive operations on the same
+        collection, so the batches are written in queue order and a failed
+        batch stops the writes which were queued after it"""
+        batches = []
+        name = None
+        for op in queue:
+            op_name = op.type.get_collection_name()
+            if not batches or op_name != name:
+                batches.append([])
+                name = op_name
+            batches[-1].append(op)
+        return batches
+
+    def _ensure_queue_indexes(self, queue):
+        # indexes can't be created by the writes of a transaction
+        for ops in self._group_queue(queue):
+            ops[0].ensure_indexes()
+
+    def _execute_batch(self, ops, result):
+        """Writes the operations ``ops`` on one collection.  Consecutive
+        saves of new documents are sent with unordered ``insert_many`` calls
+        of at most ``insert_chunk_size`` documents; the other operations go
+        through an ordered ``bulk_write``, so the queue order is kept."""
+        if not ops:
+            result.add(ops, [], None)
+            return
+        ops[0].ensure_indexes()
+        try:
+            segment = []
+            for op in ops:
+                if segment and _is_insert(op) != _is_insert(segment[0]):
+                    self._execute_segment(segment, result)
+                    segment = []
+                segment.append(op)
+            self._execute_segment(segment, result)
+        finally:
+            for op in ops:
+                op.invalidate_cache()
+
+    def _execute_segment(self, ops, result):
+        if _is_insert(ops[0]):
+            size = self.insert_chunk_size
+            for start in range(0, len(ops), size):
+                self._insert_chunk(ops[start : start + size], result)
+            return
+
+        requests = []
+        owners = []
+        for op in ops:
+            for request in op.bulk_requests():
+                requests.append(request)
+                owners.append(op)
+        if not requests:
+            result.add(ops, owners, None)
+            return
+        try:
+            bulk_result = ops[0].collection.bulk_write(
+                requests, ordered=True, **self._session_kwargs()
+            )
+        except BulkWriteError as e:
+            result.add_failed(ops, owners, e.details)
+            raise
+        result.add(ops, owners, bulk_result)
+
+    def _insert_chunk(self, ops, result):
+        try:
+            ops[0].collection.insert_many(
+                [op.data for op in ops], ordered=False, **self._session_kwargs()
+            )
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            result.add_inserts(ops, e.details.get("nInserted", 0), errors)
+            if not errors or any(error.get("code") != 11000 for error in errors):
+                raise
+            documents = [ops[error["index"]].document for error in errors]
+            raise DuplicateDocumentException(documents, errors) from e
+        result.add_inserts(ops, len(ops))
+
+    def _ref_type(self, ref, type=None):
+        if type is not None:
+            return type
+        if ref.collection not in collection_registry["global"]:
+            raise BadReferenceException("Unknown collection for reference: %r" % ref)
+        return collection_registry["global"][ref.collection]
+
+    def _ref_db(self, ref):
+        if ref.database and self.db.name != ref.database:
+            return self.db.client[ref.database]
+        return self.db
+
+    def _second_level_key(self, type, db=None):
+        if db is None:
+            db = self.db
+        return (db.name, type.get_collection_name())
+
+    def _uses_second_level_cache(self, type):
+        # a native transaction may read its own uncommitted writes
+        return (
+            self.second_level_cache is not None
+            and self._client_session is None
+            and getattr(type, "config_cache", False)
+        )
+
+    def invalidate_second_level_cache(self, type, id=None):
+        """Drops the document ``id`` of ``type``'s collection (or the whole
+        collection if ``id`` is ``None``) from the engine's second level
+        cache"""
+        if self.second_level_cache is None:
+            return
+        key = self._second_level_key(type)
+        self.second_level_cache.invalidate(key, id)
+
+    def _find_by_ids(self, type, ids, db=None):
+        """Loads the raw documents of ``type`` with an ``_id`` in ``ids``,
+        reading through the second level cache when ``type`` opts in"""
+        if db is None:
+            db = self.db
+        collection = db[type.get_collection_name()]
+        if not self._uses_second_level_cache(type):
+            return list(
+                collection.find({"_id": {"$in": ids}}, **self._session_kwargs())
+            )
+
+        cache = self.second_level_cache
+        key = self._second_level_key(type, db)
+        values = []
+        missing = []
+        for _id in ids:
+            value = cache.get(key, _id)
+            if value is None:
+                missing.append(_id)
+            else:
+                values.append(value)
+        if missing:
+            generation = cache.generation(key)
+            for value in collection.find({"_id": {"$in": missing}}):
+                cache.put(key, value["_id"], value, generation)
+                values.append(value)
+        return values
+
+    def get(self, type, mongo_id):
+        """Returns the document of class ``type`` with the id ``mongo_id``,
+        or ``None``.  Reads from the session cache, then from the second level
+        cache, before querying the database"""
+        obj = self.cache_read(mongo_id)
+        if obj is not None:
+            return obj
+        self.auto_ensure_indexes(type)
+        for value in self._find_by_ids(type, [mongo_id]):
+            obj = self._unwrap(type, value)
+            self.cache_write(obj)
+            return obj
+        return None
+
+    def dereference(self, ref, allow_none=False, type=None):
         if isinstance(ref, Document):
             return ref
-        if not hasattr(ref, "type"):
-            if ref.collection in collection_registry["global"]:
-                ref.type = collection_registry["global"][ref.collection]
-        assert hasattr(ref, "type")
+        type = self._ref_type(ref, type)
 
         obj = self.cache_read(ref.id)
         if obj is not None:
             return obj
-        if ref.database and self.db.name != ref.database:
-            db = self.db.client[ref.database]
+        if self._uses_second_level_cache(type):
+            values = self._find_by_ids(type, [ref.id], db=self._ref_db(ref))
+            value = values[0] if values else None
         else:
-            db = self.db
-        value = db.dereference(ref)
+            value = self._ref_db(ref).dereference(ref, **self._session_kwargs())
         if value is None and allow_none:
             obj = None
             self.cache_write(obj, mongo_id=ref.id)
         elif value is None:
             raise BadReferenceException("Bad reference: %r" % ref)
         else:
-            obj = self._unwrap(ref.type, value)
+            obj = self._unwrap(type, value)
             self.cache_write(obj)
         return obj
 
+    def dereference_many(self, refs, allow_none=False, type=None):
+        """Dereferences every ``DBRef`` in ``refs`` with one ``$in`` query per
+        referenced collection, skipping ids which are already in the
+        session cache.  Returns the documents in the order of ``refs``.
+
+        :param refs: a list of ``DBRef`` (or already loaded documents)
+        :param allow_none: return ``None`` for missing documents instead of \
+                raising :class:`~noalchemy.exc.BadReferenceException`
+        :param type: the :class:`Document` class of the referenced documents. \
+                If ``None`` it is looked up from each reference's collection
+        """
+        found = {}
+        missing = {}
+        for ref in refs:
+            if isinstance(ref, Document):
+                continue
+            obj = self.cache_read(ref.id)
+            if obj is not None:
+                found[(ref.database, ref.collection, ref.id)] = obj
+                continue
+            key = (ref.database, ref.collection)
+            if key not in missing:
+                missing[key] = (ref, self._ref_type(ref, type), [])
+            missing[key][2].append(ref.id)
+
+        for (database, collection), (ref, ref_type, ids) in missing.items():
+            if self._uses_second_level_cache(ref_type):
+                cursor = self._find_by_ids(ref_type, ids, db=self._ref_db(ref))
+            else:
+                cursor = self._ref_db(ref)[collection].find(
+                    {"_id": {"$in": ids}}, **self._session_kwargs()
+                )
+            for value in cursor:
+                obj = self._unwrap(ref_type, value)
+                self.cache_write(obj)
+                found[(database, collection, value["_id"])] = obj
+
+        ret = []
+        for ref in refs:
+            if isinstance(ref, Document):
+                ret.append(ref)
+                continue
+            obj = found.get((ref.database, ref.collection, ref.id))
+            if obj is None and not allow_none:
+                raise BadReferenceException("Bad reference: %r" % ref)
+            ret.append(obj)
+        return ret
+
+    def prefetch(self, documents, fields):
+        """Loads the documents referenced by ``fields`` on each of
+        ``documents`` into the session cache, with one query per referenced
+        collection.  Missing references are ignored.
+
+        :param documents: loaded :class:`Document` instances
+        :param fields: reference fields, or sequence fields of references
+        """
+        refs = {}
+        for field in fields:
+            ref_field = field if isinstance(field, RefBase) else field.item_type
+            for document in documents:
+                try:
+                    value = getattr(document, field._name)
+                except (AttributeError, FieldNotRetrieved):
+                    continue
+                if value is None:
+                    continue
+                if ref_field is not field:
+                    values = [v for v in value if v is not None]
+                else:
+                    values = [value]
+                refs.setdefault(ref_field.ref_type, []).extend(
+                    ref_field._dbref(v) for v in values
+                )
+        for type, type_refs in refs.items():
+            self.dereference_many(type_refs, allow_none=True, type=type)
+
     def refresh(self, document):
         try:
             old_cache_size = self.cache_size
@@ -344,10 +766,119 @@ class Session:
             del wrapped["_id"]
         return type(document).unwrap(wrapped, session=self)
 
-    def begin_trans(self):
-        self.transactions.append(uuid4())
+    def begin_trans(self, native=None):
+        """Opens a transaction, which may be nested.  The operations queued
+        inside are written when the outermost transaction ends, or dropped
+        if it ends with an exception.
+
+        :param native: back the outermost transaction with a MongoDB \
+                transaction, so its operations are written atomically and \
+                retried on ``TransientTransactionError``.  Defaults to the \
+                engine's ``native_transactions``.  Ignored for a nested \
+                transaction
+        """
+        if native is None:
+            native = self.native_transactions
+        if native and not self.transactions:
+            if self.engine.mock:
+                self._client_session = MockClientSession(self.db)
+            else:
+                self._client_session = self.db.client.start_session()
+        id = uuid4()
+        self._trans_parents[id] = self.transaction_id
+        self.transactions.append(id)
         return self
 
+    def flush(self):
+        """Writes the queued operations in the open native transaction, so
+        the following queries of this session see them.  They are committed
+        or aborted with the transaction"""
+        if self._client_session is None:
+            raise TransactionException("No native transaction to flush into.")
+        client_session = self._client_session
+        ops = self.queue
+        if not client_session.in_transaction:
+            # operations flushed by an aborted transaction are written again
+            ops = self._flushed + ops
+            self._ensure_queue_indexes(ops)
+            client_session.start_transaction()
+        else:
+            self._ensure_queue_indexes(ops)
+        try:
+            result = self._execute_queue(ops)
+        except:
+            if client_session.in_transaction:
+                client_session.abort_transaction()
+            self.clear_cache()
+            raise
+        self._flushed.extend(self.queue)
+        self.clear_queue()
+        return result
+
+    def _commit_native(self):
+        """Commits the open native transaction.  Unless operations were
+        flushed, they are all written by ``with_transaction``, which retries
+        on ``TransientTransactionError``.  Otherwise the remaining operations
+        are written in the open transaction first, and everything is written
+        again by ``with_transaction`` if that fails with a transient error"""
+        client_session = self._client_session
+        result = None
+        try:
+            self._ensure_queue_indexes(self._flushed + self.queue)
+            if client_session.in_transaction:
+                result = self._commit_flushed()
+            if result is None:
+                result = client_session.with_transaction(
+                    lambda _: self._execute_queue(self._flushed + self.queue)
+                )
+            # other sessions may have cached the documents before the commit
+            for op in self._flushed + self.queue:
+                op.invalidate_cache()
+        except:
+            self.clear_cache()
+            raise
+        finally:
+            self._end_native()
+        return result
+
+    def _commit_flushed(self):
+        """Writes the queue in the transaction opened by :func:`flush` and
+        commits it.  Returns ``None`` if the transaction must be retried"""
+        client_session = self._client_session
+        try:
+            result = self._execute_queue(self.queue)
+            client_session.commit_transaction()
+        except Exception as e:
+            if client_session.in_transaction:
+                client_session.abort_transaction()
+            if isinstance(e, PyMongoError) and e.has_error_label(
+                "TransientTransactionError"
+            ):
+                return None
+            raise
+        return result
+
+    def _abort_flushed(self, trans_id):
+        """Drops the operations of the transaction ``trans_id`` (and of
+        the transactions nested in it) from the flushed operations.  If any,
+        the native transaction is aborted and the remaining flushed
+        operations are written again by the next flush or commit"""
+        index = self._first_op_of(self._flushed, trans_id)
+        if index is None:
+            return False
+        self._flushed = self._flushed[:index]
+        if self._client_session.in_transaction:
+            self._client_session.abort_transaction()
+        self.clear_cache()
+        return True
+
+    def _end_native(self):
+        client_session = self._client_session
+        self._client_session = None
+        self._flushed = []
+        self.clear_queue()
+        client_session.end_session()
+
     def __enter__(self):
         return self.begin_trans()
 
@@ -358,15 +889,29 @@ class Session:
         id = self.transactions.pop()
 
         if exc_type:
-            self.clear_queue(trans_id=id)
+            if self._client_session is not None and self._abort_flushed(id):
+                # the queued operations came after the dropped ones
+                self.clear_queue()
+            else:
+                self.clear_queue(trans_id=id)
 
         if self.transactions:
             return False
 
+        self._trans_parents.clear()
         if not exc_type:
-            self.commit()
+            if self._client_session is not None:
+                self._commit_native()
+            else:
+                self.commit()
             self.close()
         else:
+            if self._client_session is not None:
+                self._end_native()
             self.clear_queue()
             self.clear_cache()
         return False
+
+
+def _is_insert(op):
+    return isinstance(op, SaveOp) and op.new
@@ -0,0 +1,60 @@
+"""
+
+Support for the native transactions of
+:class:`~noalchemy.odm.session.Session` (see ``begin_trans(native=True)``).
+
+Sessions of a real engine use a pymongo
+:class:`~pymongo.client_session.ClientSession`.  mongomock has no sessions,
+so sessions of a ``mock=True`` engine use :class:`MockClientSession`
+instead, which runs the retry loop of pymongo's ``with_transaction``.
+
+"""
+
+from pymongo.client_session import ClientSession
+from pymongo.errors import InvalidOperation
+
+
+class MockClientSession(object):
+    """A stand-in for a pymongo ``ClientSession`` on a mongomock database.
+    Starting a transaction takes a copy of every collection of ``db`` and
+    aborting it restores them, so a failed transaction leaves no writes
+    behind.  Other clients see the writes before the commit, and only the
+    collections of ``db`` are restored."""
+
+    def __init__(self, db):
+        self.db = db
+        self._snapshot = None
+
+    @property
+    def in_transaction(self):
+        return self._snapshot is not None
+
+    def start_transaction(self, *args, **kwargs):
+        if self.in_transaction:
+            raise InvalidOperation("Transaction already in progress")
+        self._snapshot = {
+            name: list(self.db[name].find())
+            for name in self.db.list_collection_names()
+        }
+
+    def commit_transaction(self):
+        if not self.in_transaction:
+            raise InvalidOperation("No transaction started")
+        self._snapshot = None
+
+    def abort_transaction(self):
+        if not self.in_transaction:
+            raise InvalidOperation("No transaction started")
+        snapshot, self._snapshot = self._snapshot, None
+        for name in self.db.list_collection_names():
+            collection = self.db[name]
+            collection.delete_many({})
+            if snapshot.get(name):
+                collection.insert_many(snapshot[name])
+
+    def end_session(self):
+        if self.in_transaction:
+            self.abort_transaction()
+
+    # only relies on the transaction methods above
+    with_transaction = ClientSession.with_transaction
@@ -0,0 +1,61 @@
+import pytest
+
+from noalchemy import create_engine
+from noalchemy.odm import sessionmaker
+
+
+@pytest.fixture
+def engine():
+    return create_engine("mongodb://localhost:27017/test", mock=True)
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def stored(Session):
+    """Returns ``store(document, *fields)``, which saves ``document`` as the
+    only document of its class and returns ``update(change)``.  ``update``
+    loads the document in a new session, applies ``change`` to it, saves
+    it and checks that ``fields`` read back hold the new values.  It
+    returns the update which was sent."""
+
+    def store(document, *fields):
+        session = Session()
+        session.add(document)
+        session.commit()
+        kind = type(document)
+
+        def update(change):
+            session = Session()
+            doc = session.query(kind).one()
+            change(doc)
+            ops = doc.get_dirty_ops()
+            session.update(doc)
+            session.commit()
+            read_back = Session().query(kind).one()
+            for name in fields:
+                assert getattr(read_back, name) == getattr(doc, name)
+            return ops
+
+        return update
+
+    return store
+
+
+@pytest.fixture
+def finds(monkeypatch):
+    """Records the collection of each ``find`` call"""
+    from mongomock.collection import Collection
+
+    calls = []
+    find = Collection.find
+
+    def spy_find(self, *args, **kwargs):
+        calls.append(self.name)
+        return find(self, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "find", spy_find)
+    return calls
@@ -0,0 +1,93 @@
+import pytest
+from pymongo import ASCENDING, DESCENDING
+
+from noalchemy.fields import IntField, ListField, StringField
+from noalchemy.odm import Document
+from noalchemy.odm.query_expression import BadQueryException
+
+
+class Sale(Document):
+    shop = StringField()
+    amount = IntField()
+    items = ListField(StringField(), default_empty=True)
+
+
+@pytest.fixture
+def sales(Session):
+    session = Session()
+    for shop, amount, items in [
+        ("a", 1, ["x"]),
+        ("a", 2, ["x", "y"]),
+        ("b", 5, []),
+        ("c", 4, ["z"]),
+    ]:
+        session.add(Sale(shop=shop, amount=amount, items=items))
+    session.commit()
+
+
+def test_pipeline(Session):
+    aggregation = (
+        Session()
+        .aggregate(Sale)
+        .match(Sale.amount > 1, shop="a")
+        .group(Sale.shop, total={"$sum": Sale.amount})
+        .sort(("total", DESCENDING))
+        .limit(2)
+    )
+    assert aggregation.pipeline() == [
+        {"$match": {"amount": {"$gt": 1}, "shop": "a"}},
+        {"$group": {"_id": "$shop", "total": {"$sum": "$amount"}}},
+        {"$sort": {"total": DESCENDING}},
+        {"$limit": 2},
+    ]
+
+
+def test_group(Session, sales):
+    totals = (
+        Session()
+        .aggregate(Sale)
+        .match(Sale.amount < 5)
+        .group(Sale.shop, total={"$sum": Sale.amount}, count={"$sum": 1})
+        .sort(("_id", ASCENDING))
+        .all()
+    )
+    assert totals == [
+        {"_id": "a", "total": 3, "count": 2},
+        {"_id": "c", "total": 4, "count": 1},
+    ]
+
+
+def test_unwind_and_project(Session, sales):
+    aggregation = (
+        Session()
+        .aggregate(Sale)
+        .unwind(Sale.items, preserve_empty=True)
+        .project(Sale.shop, Sale.items, _id=0)
+        .sort(("shop", ASCENDING), ("items", ASCENDING))
+    )
+    assert [(r["shop"], r.get("items")) for r in aggregation] == [
+        ("a", "x"),
+        ("a", "x"),
+        ("a", "y"),
+        ("b", None),
+        ("c", "z"),
+    ]
+
+
+def test_as_documents(Session, sales):
+    session = Session()
+    aggregation = session.aggregate(Sale).match(shop="b").as_documents()
+    sale = aggregation.first()
+    assert isinstance(sale, Sale) and sale.amount == 5
+    assert sale.get_dirty_ops() == {}
+
+
+def test_named_collection(Session, sales):
+    session = Session()
+    first = session.aggregate("Sale").sort(("amount", DESCENDING)).first()
+    assert first["shop"] == "b"
+
+
+def test_bad_sort(Session):
+    with pytest.raises(BadQueryException):
+        Session().aggregate(Sale).sort((Sale.amount, 2))
@@ -0,0 +1,177 @@
+import pytest
+from bson import ObjectId
+
+from noalchemy.exc import SessionCacheException
+from noalchemy import create_engine
+from noalchemy.fields import IntField, StringField
+from noalchemy.odm import Document, sessionmaker
+from noalchemy.odm import cache
+from noalchemy.odm.cache import (FIFOCache, LFUCache, LRUCache,
+                                 SecondLevelCache, WeakCache, create_cache)
+
+
+class Member(Document):
+    name = StringField()
+
+
+class Setting(Document):
+    config_cache = True
+    name = StringField()
+    value = IntField()
+
+
+def fill(cache, *keys):
+    for key in keys:
+        cache.put(key, key.upper())
+    return cache
+
+
+def test_fifo_evicts_first_inserted():
+    cache = fill(FIFOCache(3), "a", "b", "c")
+    cache.get("a")
+    cache.put("d", "D")
+    assert list(cache) == ["b", "c", "d"]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = fill(LRUCache(3), "a", "b", "c")
+    cache.get("a")
+    cache.put("b", "B")
+    cache.put("d", "D")
+    assert list(cache) == ["a", "b", "d"]
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = fill(LFUCache(3), "a", "b", "c")
+    cache.get("a")
+    cache.get("a")
+    cache.get("c")
+    cache.put("d", "D")
+    assert sorted(cache) == ["a", "c", "d"]
+    # "d" is the only entry read once
+    cache.put("e", "E")
+    assert sorted(cache) == ["a", "c", "e"]
+    # ties are broken by the least recently used
+    cache.get("e")
+    cache.put("f", "F")
+    assert sorted(cache) == ["a", "e", "f"]
+
+
+def test_lfu_remove():
+    cache = fill(LFUCache(2), "a", "b")
+    cache.get("a")
+    del cache["b"]
+    cache.put("c", "C")
+    cache.put("d", "D")
+    assert sorted(cache) == ["a", "d"]
+
+
+def test_stats():
+    cache = fill(create_cache("lru", 2), "a", "b", "c")
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    assert cache.stats() == dict(size=2, maxsize=2, hits=1, misses=1, evictions=1)
+
+
+def test_create_cache():
+    assert type(create_cache("fifo")) is FIFOCache
+    assert type(create_cache(LFUCache, 3)) is LFUCache
+    with pytest.raises(SessionCacheException):
+        create_cache("random")
+
+
+def test_session_cache_evicts(engine, Session):
+    engine.cache_size = 2
+    engine.cache_policy = "fifo"
+    session = Session()
+    for name in "abc":
+        session.add(Member(name=name))
+    session.commit()
+    members = session.query(Member).ascending(Member.name).all()
+    assert list(session.cache) == [m.mongo_id for m in members[1:]]
+    assert session.query(Member).filter(Member.name == "c").one() is members[2]
+    assert session.query(Member).filter(Member.name == "a").one() is not members[0]
+
+
+def test_weak_identity_map(engine, Session):
+    engine.cache_size = None
+    session = Session()
+    for name in "abcd":
+        session.add(Member(name=name))
+    session.commit()
+    session = sessionmaker(bind=engine, weak_identity_map=True)()
+    assert isinstance(session.cache, WeakCache)
+    members = session.query(Member).ascending(Member.name).all()
+    assert len(session.cache) == 4
+    # documents don't hold reference cycles, so they go without a collection
+    del members[2:]
+    assert len(session.cache) == 2
+    assert session.query(Member).filter(Member.name == "a").one() is members[0]
+    # like the None cached for missing references
+    session.cache_write(None, mongo_id=ObjectId())
+    assert len(session.cache) == 2
+
+
+@pytest.fixture
+def SharedSession():
+    engine = create_engine(
+        "mongodb://localhost:27017/test", mock=True, second_level_cache_size=10
+    )
+    return sessionmaker(bind=engine)
+
+
+def test_second_level_cache_shared(SharedSession, finds):
+    session = SharedSession()
+    setting = Setting(name="a", value=1)
+    session.add(setting)
+    session.commit()
+    values = [SharedSession().get(Setting, setting.mongo_id).value for i in range(3)]
+    assert values == [1, 1, 1]
+    assert finds == ["Setting"]
+    assert session.second_level_cache.stats()["hits"] == 2
+
+
+def test_second_level_cache_invalidated(SharedSession):
+    session = SharedSession()
+    setting = Setting(name="a", value=1)
+    session.add(setting)
+    session.commit()
+    mongo_id = setting.mongo_id
+
+    session = SharedSession()
+    setting = session.get(Setting, mongo_id)
+    setting.value = 2
+    session.update(setting)
+    session.commit()
+    assert SharedSession().get(Setting, mongo_id).value == 2
+
+    session = SharedSession()
+    session.query(Setting).filter(Setting.name == "a").set(Setting.value, 3).execute()
+    session.commit()
+    assert SharedSession().get(Setting, mongo_id).value == 3
+
+    session = SharedSession()
+    session.remove(session.get(Setting, mongo_id))
+    session.commit()
+    assert SharedSession().get(Setting, mongo_id) is None
+
+
+def test_second_level_cache_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    shared = SecondLevelCache(ttl=10)
+    shared.put("c", 1, {"_id": 1}, shared.generation("c"))
+    assert shared.get("c", 1) == {"_id": 1}
+    now[0] += 11
+    assert shared.get("c", 1) is None
+
+
+def test_second_level_cache_skips_stale_reads():
+    shared = SecondLevelCache()
+    generation = shared.generation("c")
+    shared.invalidate("c", 1)
+    shared.put("c", 1, {"_id": 1}, generation)
+    assert shared.get("c", 1) is None
+    shared.put("c", 1, {"_id": 1}, shared.generation("c"))
+    shared.invalidate("c")
+    assert shared.get("c", 1) is None
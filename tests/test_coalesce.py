@@ -0,0 +1,74 @@
+from noalchemy.fields import IntField, StringField
+from noalchemy.odm import Document
+from noalchemy.odm.document import Index
+
+
+class Account(Document):
+    email = StringField()
+    n = IntField(required=False)
+    i_email = Index().ascending("email").unique()
+
+
+def test_save_then_updates_merged(Session):
+    session = Session()
+    account = Account(email="a")
+    session.add(account)
+    account.n = 1
+    session.update(account)
+    account.email = "b"
+    session.update(account)
+    result = session.commit()
+    assert len(result.op_results) == 1
+    assert len(result.coalesced) == 2
+    stored = Session().query(Account).one()
+    assert (stored.email, stored.n) == ("b", 1)
+
+
+def test_updates_merged(Session):
+    session = Session()
+    session.add(Account(email="a", n=0))
+    session.commit()
+
+    session = Session()
+    account = session.query(Account).one()
+    account.n = 5
+    session.update(account)
+    account.email = "c"
+    session.update(account)
+    assert [op.dirty_ops for op in session.queue] == [
+        {"$set": {"n": 5}},
+        {"$set": {"email": "c"}},
+    ]
+    result = session.commit()
+    assert len(result.op_results) == 1
+    stored = Session().query(Account).one()
+    assert (stored.email, stored.n) == ("c", 5)
+
+
+def test_writes_to_other_documents_are_not_reordered(Session):
+    session = Session()
+    first = Account(email="x")
+    session.add(first)
+    session.commit()
+
+    first.email = "y"
+    session.update(first)
+    session.add(Account(email="x"))
+    first.n = 1
+    session.update(first)
+    result = session.commit()
+    assert result.coalesced == []
+    emails = sorted(account.email for account in Session().query(Account))
+    assert emails == ["x", "y"]
+
+
+def test_query_update_is_a_barrier(Session):
+    session = Session()
+    account = Account(email="w", n=1)
+    session.add(account)
+    session.query(Account).filter(Account.email == "w").set(Account.n, 9).execute()
+    account.n = 3
+    session.add(account)
+    result = session.commit()
+    assert len(result.op_results) == 3
+    assert Session().query(Account).one().n == 3
@@ -0,0 +1,77 @@
+import pytest
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from noalchemy.fields import IntField, StringField
+from noalchemy.odm import Document
+from noalchemy.odm.document import Index
+
+
+class Ledger(Document):
+    name = StringField()
+
+
+class Unique(Document):
+    email = StringField()
+    n = IntField(required=False)
+    i_email = Index().ascending("email").unique()
+
+
+@pytest.fixture
+def taken(Session):
+    """Two saved documents, the second one to be renamed to the first's
+    email"""
+    session = Session()
+    session.add(Unique(email="a"))
+    session.add(Unique(email="b"))
+    session.commit()
+
+
+def test_batches_follow_queue_order(Session):
+    session = Session()
+    session.add(Ledger(name="l1"))
+    session.add(Unique(email="u1"))
+    session.add(Ledger(name="l2"))
+    result = session.commit()
+    assert [r.op.type.__name__ for r in result.op_results] == [
+        "Ledger",
+        "Unique",
+        "Ledger",
+    ]
+    assert all(r.applied for r in result.op_results)
+    assert result.inserted_count == 3
+
+
+def test_failed_write_stops_later_batches(Session, taken):
+    session = Session()
+    first, second = session.query(Unique).sort((Unique.email, ASCENDING)).all()
+    session.add(Ledger(name="l1"))
+    second.email = "a"
+    session.update(second)
+    session.add(Ledger(name="l2"))
+    with pytest.raises(BulkWriteError) as info:
+        session.commit()
+    assert [ledger.name for ledger in Session().query(Ledger)] == ["l1"]
+
+    results = info.value.commit_result.op_results
+    assert [r.applied for r in results] == [True, False, False]
+    assert results[1].op.db_key == {"_id": second.mongo_id}
+    assert results[1].error["code"] == 11000
+    assert results[2].error is None
+    assert session.queue == []
+
+
+def test_ops_before_failure_in_a_batch_applied(Session, taken):
+    session = Session()
+    first, second = session.query(Unique).sort((Unique.email, ASCENDING)).all()
+    first.n = 1
+    session.update(first)
+    second.email = "a"
+    session.update(second)
+    first.n = 2
+    session.update(first)
+    with pytest.raises(BulkWriteError) as info:
+        session.commit()
+    results = info.value.commit_result.op_results
+    assert [r.applied for r in results] == [True, False, False]
+    assert Session().query(Unique).filter(Unique.email == "a").one().n == 1
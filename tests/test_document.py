@@ -0,0 +1,41 @@
+import copy
+import pickle
+
+from noalchemy.fields import IntField, ListField, StringField
+from noalchemy.odm import Document
+from noalchemy.odm.document import LazyValue, Value
+
+
+class Task(Document):
+    title = StringField()
+    priority = IntField(required=False)
+    labels = ListField(StringField(), default_empty=True)
+
+
+def test_values_have_no_dict():
+    task = Task(title="t")
+    assert not hasattr(task._values["title"], "__dict__")
+    assert "__dict__" not in Value.__slots__ + LazyValue.__slots__
+
+
+def test_pickled_document_keeps_state(Session):
+    session = Session()
+    session.add(Task(title="t", priority=1, labels=["a"]))
+    session.commit()
+    task = Session().query(Task).one()
+    task.priority = 2
+    task.labels.append("b")
+    copied = pickle.loads(pickle.dumps(task))
+    assert copied.wrap() == task.wrap()
+    assert copied.get_dirty_ops() == task.get_dirty_ops()
+    assert copied._values["title"].field is Task.get_fields()["title"]
+    del copied.priority
+    assert copied.get_dirty_ops()["$unset"] == {"priority": True}
+
+
+def test_deepcopied_document_is_independent():
+    task = Task(title="t", labels=["a"])
+    copied = copy.deepcopy(task)
+    copied.labels.append("b")
+    copied.title = "u"
+    assert (task.title, task.labels) == ("t", ["a"])
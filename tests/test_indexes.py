@@ -0,0 +1,66 @@
+import gc
+
+import pytest
+
+from noalchemy import create_engine
+from noalchemy.fields import StringField
+from noalchemy.odm import Document, sessionmaker
+from noalchemy.odm.document import Index, index_registry
+
+
+class Tagged(Document):
+    tag = StringField()
+    i_tag = Index().ascending("tag")
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Records the collection of each ``create_indexes`` call"""
+    from mongomock.collection import Collection
+
+    calls = []
+    create_indexes = Collection.create_indexes
+
+    def spy_create_indexes(self, indexes, *args, **kwargs):
+        calls.append(self.name)
+        return create_indexes(self, indexes, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "create_indexes", spy_create_indexes)
+    return calls
+
+
+def test_indexes_ensured_once(Session, created):
+    session = Session()
+    session.add(Tagged(tag="a"))
+    session.commit()
+    session.query(Tagged).all()
+    Session().query(Tagged).count()
+    assert created == ["Tagged"]
+    assert "tag_1" in session.get_indexes(Tagged)
+
+
+def test_invalidated_indexes_ensured_again(Session, created):
+    session = Session()
+    session.query(Tagged).all()
+    session.invalidate_indexes(Tagged)
+    session.query(Tagged).all()
+    session.invalidate_indexes()
+    session.query(Tagged).all()
+    assert created == ["Tagged"] * 3
+
+
+def test_registry_is_per_client(Session, created):
+    other = create_engine("mongodb://localhost:27017/test", mock=True)
+    Session().query(Tagged).all()
+    sessionmaker(bind=other)().query(Tagged).all()
+    assert created == ["Tagged"] * 2
+
+
+def test_registry_forgets_collected_clients():
+    engine = create_engine("mongodb://localhost:27017/test", mock=True)
+    sessionmaker(bind=engine)().query(Tagged).all()
+    key = id(engine.database.client)
+    assert key in index_registry
+    del engine
+    gc.collect()
+    assert key not in index_registry
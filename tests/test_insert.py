@@ -0,0 +1,104 @@
+import pytest
+
+from noalchemy.exc import DuplicateDocumentException
+from noalchemy.fields import IntField, StringField
+from noalchemy.odm import Document
+from noalchemy.odm.document import Index
+
+
+class Item(Document):
+    name = StringField()
+    n = IntField(required=False)
+
+
+class UniqueItem(Document):
+    name = StringField()
+    i_name = Index().ascending("name").unique()
+
+
+@pytest.fixture
+def spy(monkeypatch):
+    """Records the number of documents of each ``insert_many`` call"""
+    from mongomock.collection import Collection
+
+    calls = []
+    insert_many = Collection.insert_many
+
+    def spy_insert_many(self, documents, *args, **kwargs):
+        calls.append(len(documents))
+        return insert_many(self, documents, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "insert_many", spy_insert_many)
+    return calls
+
+
+def test_new_documents_inserted_in_chunks(Session, spy):
+    session = Session()
+    session.insert_chunk_size = 3
+    for i in range(7):
+        session.add(Item(name="i%d" % i))
+    assert all(op.new for op in session.queue)
+    result = session.commit()
+    assert spy == [3, 3, 1]
+    assert result.inserted_count == 7
+    assert len(result.op_results) == 7
+    assert Session().query(Item).count() == 7
+
+
+def test_saved_document_is_replaced(Session, spy):
+    session = Session()
+    item = Item(name="a")
+    session.add(item)
+    session.commit()
+    item.n = 2
+    session.add(item)
+    assert not session.queue[0].new
+    result = session.commit()
+    assert spy == [1]
+    assert result.inserted_count == 0
+    assert Session().query(Item).one().n == 2
+
+
+def test_queue_order_kept_around_inserts(Session, spy):
+    session = Session()
+    item = Item(name="a", n=0)
+    session.add(item)
+    session.commit()
+    session.add(Item(name="b"))
+    item.n = 1
+    session.update(item)
+    session.add(Item(name="c"))
+    result = session.commit()
+    assert spy == [1, 1, 1]
+    assert result.inserted_count == 2
+    assert result.modified_count == 1
+
+
+def test_duplicates_mapped_to_documents(Session):
+    session = Session()
+    session.add(UniqueItem(name="a"))
+    session.commit()
+
+    duplicate = UniqueItem(name="a")
+    session.add(UniqueItem(name="b"))
+    session.add(duplicate)
+    session.add(UniqueItem(name="c"))
+    with pytest.raises(DuplicateDocumentException) as info:
+        session.commit()
+    assert info.value.documents == [duplicate]
+    assert len(info.value.errors) == 1
+    assert info.value.errors[0]["code"] == 11000
+    names = sorted(item.name for item in Session().query(UniqueItem))
+    assert names == ["a", "b", "c"]
+
+
+def test_added_then_removed_document_not_written(Session, spy):
+    session = Session()
+    item = Item(name="z")
+    session.add(item)
+    session.remove(item)
+    result = session.commit()
+    assert result.op_results == []
+    assert len(result.coalesced) == 2
+    assert spy == []
+    assert Session().query(Item).count() == 0
@@ -0,0 +1,75 @@
+import pickle
+
+import pytest
+
+from noalchemy.exc import BadValueException
+from noalchemy.fields import IntField, KVField, ListField, StringField
+from noalchemy.odm import Document, sessionmaker
+
+
+class Record(Document):
+    name = StringField()
+    size = IntField(max_value=10)
+    items = ListField(IntField())
+    counts = KVField(StringField(), IntField())
+
+
+@pytest.fixture
+def record(Session):
+    session = Session()
+    session.add(Record(name="r", size=1, items=[1, 2], counts={"k": 1}))
+    session.commit()
+
+
+def loaded(document):
+    return {name: value.loaded for name, value in document._values.items()}
+
+
+def test_lazy_values_decoded_on_read(Session, record):
+    session = Session()
+    lazy = session.query(Record).lazy().one()
+    # the identity map needs the id
+    assert loaded(lazy) == dict(
+        mongo_id=True, name=False, size=False, items=False, counts=False
+    )
+    assert lazy.get_dirty_ops() == {}
+    assert lazy.name == "r"
+    assert loaded(lazy)["name"] and not loaded(lazy)["items"]
+    assert lazy.wrap() == Session().query(Record).one().wrap()
+
+
+def test_lazy_values_changed(Session, record):
+    session = Session()
+    lazy = session.query(Record).lazy().one()
+    lazy.size = 5
+    assert lazy.get_dirty_ops() == {"$set": {"size": 5}}
+    lazy.items.append(3)
+    assert lazy.get_dirty_ops() == {
+        "$set": {"size": 5},
+        "$push": {"items": {"$each": [3]}},
+    }
+    del lazy.name
+    session.update(lazy)
+    session.commit()
+    assert session.db.Record.find_one({}, {"_id": 0}) == {
+        "size": 5,
+        "items": [1, 2, 3],
+        "counts": [{"k": "k", "v": 1}],
+    }
+
+
+def test_lazy_values_validated_on_read(engine, Session, record):
+    Session().db.Record.update_one({}, {"$set": {"size": 99}})
+    session = sessionmaker(bind=engine, lazy_load=True)()
+    lazy = session.query(Record).one()
+    assert lazy.name == "r"
+    with pytest.raises(BadValueException):
+        lazy.size
+
+
+def test_pickled_lazy_values_decoded(Session, record):
+    lazy = Session().query(Record).lazy().one()
+    copy = pickle.loads(pickle.dumps(lazy))
+    assert all(loaded(copy).values())
+    assert copy.counts == {"k": 1}
+    assert copy.get_dirty_ops() == {}
@@ -0,0 +1,114 @@
+import copy
+
+import bson
+import pytest
+from bson.raw_bson import RawBSONDocument
+
+from noalchemy.exc import (BadValueException, ExtraValueException,
+                           FieldNotRetrieved)
+from noalchemy.fields import (DictField, DocumentField, IntField, KVField,
+                              ListField, RefField, StringField)
+from noalchemy.odm import Document, sessionmaker
+
+
+class Point(Document):
+    x = IntField()
+    y = IntField(required=False)
+
+
+class Shape(Document):
+    name = StringField(db_field="n")
+    origin = DocumentField(Point)
+    sides = ListField(IntField(), default_empty=True)
+
+
+class Drawing(Document):
+    shapes = ListField(DocumentField(Shape))
+    colors = DictField(IntField())
+    layers = KVField(StringField(), IntField())
+    refs = ListField(RefField(), default_empty=True)
+
+
+class Code(Document):
+    code = StringField(max_length=3)
+
+
+class Loose(Document):
+    config_extra_fields = "ignore"
+    a = IntField()
+
+
+def test_loaded_document_matches_saved(Session):
+    session = Session()
+    session.add(Shape(name="square", origin=Point(x=1, y=2), sides=[1, 1, 1, 1]))
+    session.commit()
+    assert session.db.Shape.find_one({}, {"_id": 0}) == {
+        "n": "square",
+        "origin": {"x": 1, "y": 2},
+        "sides": [1, 1, 1, 1],
+    }
+    shape = Session().query(Shape).one()
+    assert (shape.name, shape.origin.x, shape.origin.y) == ("square", 1, 2)
+    assert shape.sides == [1, 1, 1, 1]
+    assert shape.get_dirty_ops() == {}
+    assert copy.deepcopy(shape).wrap() == shape.wrap()
+    shape.name = "cube"
+    assert shape.get_dirty_ops() == {"$set": {"n": "cube"}}
+
+
+def test_partial_load(Session):
+    session = Session()
+    session.add(Shape(name="line", origin=Point(x=1, y=2)))
+    session.commit()
+    shape = Session().query(Shape).fields(Shape.origin.x).one()
+    assert shape.partial
+    assert shape.origin.x == 1
+    with pytest.raises(FieldNotRetrieved):
+        shape.name
+
+
+def test_extra_fields(Session):
+    session = Session()
+    session.db.Loose.insert_one({"a": 1, "b": 2})
+    loose = session.query(Loose).one()
+    assert loose.get_extra_fields() == {"b": 2}
+    assert loose.wrap()["b"] == 2
+    session.db.Point.insert_one({"x": 1, "z": 2})
+    with pytest.raises(ExtraValueException):
+        session.query(Point).one()
+
+
+def test_trusted_load_skips_validation(engine, Session):
+    session = Session()
+    session.db.Code.insert_one({"code": "toolong"})
+    with pytest.raises(BadValueException):
+        session.query(Code).one()
+    code = session.query(Code).trusted().one()
+    assert code.code == "toolong"
+    with pytest.raises(BadValueException):
+        code.validate()
+    assert session.query(Code).trusted().clone()._trusted
+    untrusted = sessionmaker(bind=engine, validate_on_load=False)()
+    assert untrusted.query(Code).one().code == "toolong"
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unwrap_raw_bson(lazy):
+    drawing = Drawing(
+        shapes=[Shape(name="dot", origin=Point(x=1))],
+        colors={"red": 1},
+        layers={"top": 2},
+        refs=[bson.DBRef("Point", bson.ObjectId())],
+    )
+    drawing.mongo_id = bson.ObjectId()
+    raw = RawBSONDocument(bson.encode(drawing.wrap()))
+    loaded = Drawing.unwrap(raw, lazy=lazy)
+    assert loaded.shapes[0].origin.x == 1
+    assert (loaded.colors, loaded.layers) == ({"red": 1}, {"top": 2})
+    assert isinstance(loaded.refs[0], bson.DBRef)
+    assert loaded.wrap() == drawing.wrap()
+
+
+def test_raw_bson_query(Session):
+    query = Session().query(Drawing).raw_bson().lazy()
+    assert query.clone()._raw_bson and query.clone()._lazy
@@ -0,0 +1,72 @@
+import pytest
+
+from noalchemy.fields import DictField, IntField, KVField, StringField
+from noalchemy.fields.base import ARRAY_FILTERS
+from noalchemy.odm import Document
+
+
+class MappingDoc(Document):
+    d = DictField(IntField(), default_empty=True)
+    kv = KVField(StringField(), IntField(), default_empty=True)
+    kva = KVField(IntField(), StringField(), default_empty=True, array_filters=True)
+
+
+@pytest.fixture
+def update(stored):
+    document = MappingDoc(
+        d={"a": 1, "b": 2, "c": 3, "e": 5},
+        kv={"x": 1, "y": 2, "z": 3},
+        kva={1: "a", 2: "b"},
+    )
+    return stored(document, "d", "kv", "kva")
+
+
+def test_unchanged(update):
+    assert update(lambda doc: None) == {}
+
+
+def test_dict_key_set(update):
+    ops = update(lambda doc: doc.d.__setitem__("a", 10))
+    assert ops == {"$set": {"d.a": 10}}
+
+
+def test_dict_key_unset(update):
+    assert update(lambda doc: doc.d.pop("b")) == {"$unset": {"d.b": True}}
+
+
+def test_dict_many_changes_set_whole_dict(update):
+    def change_most(doc):
+        doc.d.update(a=0, b=0, c=0)
+
+    ops = update(change_most)
+    assert ops == {"$set": {"d": {"a": 0, "b": 0, "c": 0, "e": 5}}}
+
+
+def test_kv_added_and_removed_keys(update):
+    ops = update(lambda doc: doc.kv.__setitem__("w", 4))
+    assert ops == {"$push": {"kv": {"$each": [{"k": "w", "v": 4}]}}}
+    ops = update(lambda doc: doc.kv.pop("x"))
+    assert ops == {"$pull": {"kv": {"k": {"$in": ["x"]}}}}
+
+
+def test_kv_changed_value_sets_whole_list(update):
+    ops = update(lambda doc: doc.kv.__setitem__("y", 20))
+    assert list(ops) == ["$set"]
+    assert {"k": "y", "v": 20} in ops["$set"]["kv"]
+
+
+def test_kv_array_filters(Session, update):
+    session = Session()
+    doc = session.query(MappingDoc).one()
+    doc.kva[2] = "B"
+    ops = doc.get_dirty_ops()
+    (path, value), = ops["$set"].items()
+    (identifier, condition), = ops[ARRAY_FILTERS].items()
+    assert path == "kva.$[%s].v" % identifier
+    assert value == "B"
+    assert condition == {identifier + ".k": 2}
+
+    session.update(doc)
+    op = session.queue[-1]
+    assert op.dirty_ops == {"$set": {path: "B"}}
+    assert op.array_filters == [{identifier + ".k": 2}]
@@ -0,0 +1,251 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from noalchemy.fields import DocumentField, IntField, StringField
+from noalchemy.odm import Document, cache
+from noalchemy.odm.cache import CountCache
+from noalchemy.odm.query import _resolve_name
+from noalchemy.odm.query_expression import BadQueryException
+
+
+class Address(Document):
+    city = StringField()
+
+
+class Person(Document):
+    name = StringField()
+    address = DocumentField(Address)
+
+
+class Row(Document):
+    n = IntField()
+
+
+class Tie(Document):
+    group = IntField()
+    name = StringField()
+
+
+@pytest.fixture
+def rows(Session):
+    session = Session()
+    for n in range(25):
+        session.add(Row(n=n))
+    session.commit()
+
+
+def test_resolved_names_are_new_fields():
+    first = _resolve_name(Person, "address.city")
+    second = _resolve_name(Person, "address.city")
+    assert first is not second
+    assert str(first) == str(second) == "address.city"
+    assert first.get_type() is second.get_type()
+
+
+def test_excluded_field_does_not_leak(Session):
+    session = Session()
+    _resolve_name(Person, "name").exclude()
+    _resolve_name(Person, "address").matched_index()
+    query = session.query(Person).fields("name", "address")
+    assert query._fields_expression() == {"name": True, "address": True, "_id": True}
+
+
+def test_resolved_names_do_not_keep_classes():
+    class Temporary(Document):
+        name = StringField()
+
+    references = sys.getrefcount(Temporary)
+    _resolve_name(Temporary, "name")
+    _resolve_name(Temporary, "name")
+    assert sys.getrefcount(Temporary) == references
+
+
+def test_iter_batches(Session, rows):
+    query = Session().query(Row).ascending(Row.n)
+    batches = list(query.iter_batches(10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [row.n for batch in batches for row in batch] == list(range(25))
+    assert [len(batch) for batch in query.limit(20).iter_batches(10)] == [10, 10]
+    assert list(Session().query(Row).filter(Row.n > 100).iter_batches(10)) == []
+    with pytest.raises(BadQueryException):
+        next(query.iter_batches(0))
+
+
+def test_cursor_options(Session, rows, monkeypatch):
+    from mongomock.collection import Cursor
+
+    options = []
+
+    def spy(method):
+        def record(self, value):
+            # mongomock passes max_time_ms=None to every cursor
+            if value is not None:
+                options.append((method.__name__, value))
+            return method(self, value)
+
+        return record
+
+    monkeypatch.setattr(Cursor, "batch_size", spy(Cursor.batch_size))
+    monkeypatch.setattr(Cursor, "max_time_ms", spy(Cursor.max_time_ms))
+    query = Session().query(Row).batch_size(7).max_time_ms(5000)
+    assert len(list(query.clone())) == 25
+    list(Session().query(Row).iter_batches(10))
+    assert options == [("batch_size", 7), ("max_time_ms", 5000), ("batch_size", 10)]
+
+
+def walk(query, page_size, by_document=False):
+    """Returns every page of ``query``, following the tokens (or the last
+    documents) of ``paginate_after``"""
+    pages, after = [], None
+    while True:
+        page, token = query.clone().paginate_after(after, page_size)
+        pages.append(page)
+        if token is None:
+            return pages
+        after = page[-1] if by_document else token
+
+
+@pytest.mark.parametrize("by_document", [False, True])
+@pytest.mark.parametrize("page_size", [1, 4, 5, 23])
+def test_paginate_after(Session, by_document, page_size):
+    session = Session()
+    for i in range(20):
+        session.add(Tie(group=i % 3, name="n%d" % (i % 4)))
+    session.commit()
+    query = session.query(Tie).descending(Tie.group).ascending(Tie.name)
+    expected = sorted(query.all(), key=lambda t: (-t.group, t.name, t.mongo_id))
+    pages = walk(query, page_size, by_document)
+    assert all(len(page) == page_size for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= page_size
+    ids = [t.mongo_id for page in pages for t in page]
+    assert ids == [t.mongo_id for t in expected]
+
+
+def test_paginate_after_concurrent_insert(Session, rows):
+    query = Session().query(Row).ascending(Row.n)
+    first, token = query.clone().paginate_after(None, 10)
+    session = Session()
+    session.add(Row(n=-1))
+    session.commit()
+    second, token = query.clone().paginate_after(token, 10)
+    assert [row.n for row in first + second] == list(range(20))
+
+
+def test_paginate_after_raw_output(Session, rows):
+    query = Session().query(Row).filter(Row.n < 10).raw_output()
+    pages = walk(query, 3)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sorted(row["n"] for page in pages for row in page) == list(range(10))
+
+
+def test_paginate_after_bad_token(Session, rows):
+    query = Session().query(Row).ascending(Row.n)
+    with pytest.raises(BadQueryException):
+        query.paginate_after("garbage", 3)
+    page, token = query.paginate_after(None, 3)
+    with pytest.raises(BadQueryException):
+        Session().query(Row).descending(Row.n).paginate_after(token, 3)
+
+
+@pytest.mark.parametrize("workers", [1, 3, 4])
+def test_parallel_iter(Session, rows, workers):
+    query = Session().query(Row).filter(Row.n >= 5).fields(Row.n)
+    expected = sorted(row.mongo_id for row in query.clone())
+    found = list(query.parallel_iter(workers=workers, batch_size=2))
+    assert sorted(row.mongo_id for row in found) == expected
+    assert all(row.partial and row.n >= 5 for row in found)
+    ordered = query.parallel_iter(workers=workers, ordered=True)
+    assert [row.mongo_id for row in ordered] == expected
+
+
+def test_parallel_iter_other_id_types(Session, rows):
+    session = Session()
+    session.db.Row.insert_many([{"_id": "a", "n": 1}, {"_id": 2, "n": 2}])
+    found = list(session.query(Row).raw_output().parallel_iter(workers=3))
+    assert len(found) == 27
+    assert len({row["_id"] for row in found}) == 27
+
+
+def test_parallel_iter_needs_whole_query(Session):
+    with pytest.raises(BadQueryException):
+        Session().query(Row).limit(3).parallel_iter()
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+def test_process_pool(engine, Session, rows, pool):
+    engine.cache_size = None
+    session = Session()
+    query = session.query(Row).ascending(Row.n).process_pool(pool, chunk_size=4)
+    found = query.all()
+    assert [row.n for row in found] == list(range(25))
+    assert all(row._session is session for row in found)
+    assert session.query(Row).filter(Row.n == 3).one() is found[3]
+    assert found[3].get_dirty_ops() == {}
+    found[3].n = 30
+    assert found[3].get_dirty_ops() == {"$set": {"n": 30}}
+    assert len(list(iter(query.clone()).clone())) == 25
+
+
+def test_process_pool_dicts(Session, rows, pool):
+    query = Session().query(Row).filter(Row.n == 3).fields(Row.n)
+    found = query.process_pool(pool, as_dicts=True).one()
+    assert set(found) == {"mongo_id", "n"} and found["n"] == 3
+
+
+def test_count(Session, rows):
+    query = Session().query(Row).filter(Row.n >= 5).skip(3).limit(10)
+    assert query.count() == 20
+    assert query.count(with_limit_and_skip=True) == 10
+    assert query.skip(15).count(with_limit_and_skip=True) == 5
+    assert Session().query(Row).max_time_ms(1000).estimated_count() == 25
+    with pytest.raises(BadQueryException):
+        query.estimated_count()
+
+
+def test_cached_count(Session, rows, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    assert Session().query(Row).filter(Row.n < 10).count(cache_ttl=60) == 10
+    session = Session()
+    session.add(Row(n=0))
+    session.commit()
+    assert Session().query(Row).filter(Row.n < 10).count(cache_ttl=60) == 10
+    assert Session().query(Row).filter(Row.n < 10).count() == 11
+    assert Session().query(Row).filter(Row.n < 5).count(cache_ttl=60) == 6
+    now[0] += 61
+    assert Session().query(Row).filter(Row.n < 10).count(cache_ttl=60) == 11
+
+
+def test_count_cache_bound():
+    counts = CountCache(maxsize=2)
+    for key in "abc":
+        counts.put(key, 1, 60)
+    assert len(counts) == 2
+    assert counts.get("a") is None and counts.get("c") == 1
+
+
+def test_memoized_filter(Session):
+    query = Session().query(Row).filter(Row.n > 1)
+    compiled = query.query
+    assert query.query is compiled
+    query.filter(Row.n < 5)
+    assert query.query == {"n": {"$gt": 1, "$lt": 5}}
+
+
+def test_memoized_filter_clone_isolation(Session, rows):
+    query = Session().query(Row).filter(Row.n > 1).fields(Row.n)
+    query.query, query._fields_expression()
+    clone = query.clone()
+    clone.filter(Row.n < 5).fields("mongo_id")
+    clone._fields_expression()["n"] = False
+    assert query.query == {"n": {"$gt": 1}}
+    assert clone.query == {"n": {"$gt": 1, "$lt": 5}}
+    assert query._fields_expression() == {"n": True, "_id": True}
+    assert len(query.all()) == 23 and len(clone.all()) == 3
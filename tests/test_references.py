@@ -0,0 +1,165 @@
+import pytest
+from bson import DBRef, ObjectId
+
+from noalchemy.exc import BadReferenceException
+from noalchemy.fields import (DocumentField, ListField, RefField, SRefField,
+                              StringField)
+from noalchemy.odm import Document
+from noalchemy.odm.query import QueryResult
+from noalchemy.odm.query_expression import BadQueryException
+
+
+class Author(Document):
+    name = StringField()
+
+
+class Book(Document):
+    title = StringField()
+    author = RefField(DocumentField(Author), required=False)
+    author_rel = author.rel()
+    editor = SRefField(Author, required=False)
+    editor_rel = editor.rel()
+    authors = ListField(SRefField(Author), default_empty=True)
+    authors_rel = authors.rel()
+
+
+class Note(Document):
+    author = RefField(required=False)
+    author_rel = author.rel()
+
+
+class Shelf(Document):
+    books = ListField(RefField(), default_empty=True)
+    books_rel = books.rel(ignore_missing=True)
+
+
+@pytest.fixture
+def authors(Session):
+    session = Session()
+    authors = [Author(name="a%d" % i) for i in range(5)]
+    for author in authors:
+        session.add(author)
+    session.commit()
+    return authors
+
+
+def test_reference_list_dereferenced_in_one_query(Session, authors, finds):
+    session = Session()
+    session.add(Book(title="b", authors=[a.mongo_id for a in authors]))
+    session.commit()
+    book = Session().query(Book).one()
+    del finds[:]
+    assert [a.name for a in book.authors_rel] == ["a0", "a1", "a2", "a3", "a4"]
+    assert finds == ["Author"]
+
+
+def test_dereference_many(engine, Session, authors, finds):
+    engine.cache_size = None
+    session = Session()
+    cached = session.query(Author).filter(Author.name == "a0").one()
+    del finds[:]
+    refs = [authors[2].to_ref(), authors[0].to_ref(), authors[2].to_ref()]
+    found = session.dereference_many(refs)
+    assert [a.name for a in found] == ["a2", "a0", "a2"]
+    assert found[1] is cached
+    assert finds == ["Author"]
+
+
+def test_missing_references(Session, authors):
+    session = Session()
+    session.add(Book(title="b", authors=[authors[0].mongo_id, ObjectId()]))
+    missing = DBRef("Author", ObjectId())
+    session.add(Shelf(books=[authors[1].to_ref(), missing]))
+    session.commit()
+    with pytest.raises(BadReferenceException):
+        list(Session().query(Book).one().authors_rel)
+    assert [a.name for a in Session().query(Shelf).one().books_rel] == ["a1"]
+    assert Session().dereference_many([missing], allow_none=True) == [None]
+
+
+@pytest.fixture
+def books(engine, Session, authors):
+    engine.cache_size = None
+    session = Session()
+    for i in range(6):
+        session.add(
+            Book(
+                title="b%d" % i,
+                author=authors[i % 5].to_ref(),
+                editor=authors[(i + 1) % 5].mongo_id,
+                authors=[authors[2].mongo_id],
+            )
+        )
+    session.commit()
+
+
+def test_prefetch(Session, books, finds):
+    query = Session().query(Book).prefetch(Book.author, "editor", Book.authors_rel)
+    loaded = [
+        (b.author_rel.name, b.editor_rel.name, [a.name for a in b.authors_rel])
+        for b in query.ascending(Book.title)
+    ]
+    assert loaded[1] == ("a1", "a2", ["a2"])
+    assert finds == ["Book", "Author"]
+
+
+def test_prefetch_by_batch(Session, books, finds, monkeypatch):
+    monkeypatch.setattr(QueryResult, "prefetch_batch_size", 4)
+    query = Session().query(Book).prefetch(Book.author)
+    assert sorted(b.author_rel.name for b in query) == [
+        "a0", "a0", "a1", "a2", "a3", "a4"
+    ]
+    assert finds == ["Book", "Author", "Author"]
+
+
+def test_prefetch_needs_reference_and_cache(engine, Session):
+    with pytest.raises(BadQueryException):
+        Session().query(Book).prefetch(Book.title)
+    engine.cache_size = 0
+    with pytest.warns(RuntimeWarning):
+        Session().query(Book).prefetch(Book.author)
+
+
+def test_lookup(Session, books, finds):
+    query = (
+        Session()
+        .query(Book)
+        .filter(Book.title >= "b2")
+        .descending(Book.title)
+        .limit(3)
+        .lookup(Book.editor, Book.authors_rel)
+    )
+    books = query.all()
+    # mongomock runs aggregations with find
+    del finds[:]
+    loaded = [
+        (b.title, b.editor_rel.name, [a.name for a in b.authors_rel]) for b in books
+    ]
+    assert loaded == [("b5", "a1", ["a2"]), ("b4", "a0", ["a2"]), ("b3", "a4", ["a2"])]
+    assert finds == []
+
+
+def test_lookup_dbref(Session):
+    # mongomock can't run $objectToArray on a DBRef, so only the stages are checked
+    pipeline = Session().query(Book).lookup(Book.author)._pipeline()
+    assert [list(stage) for stage in pipeline] == [
+        ["$match"],
+        ["$addFields"],
+        ["$lookup"],
+    ]
+    assert pipeline[2]["$lookup"]["localField"] == "_lookup_author_id"
+
+
+def test_lookup_with_projection(Session, books):
+    query = Session().query(Book).fields(Book.title, Book.editor).lookup(Book.editor)
+    books = query.ascending(Book.title).limit(2).all()
+    assert [(b.title, b.editor_rel.name) for b in books] == [
+        ("b0", "a1"),
+        ("b1", "a2"),
+    ]
+    assert "_lookup_editor" not in books[0].get_extra_fields()
+
+
+def test_lookup_needs_typed_reference(Session):
+    with pytest.raises(BadQueryException):
+        Session().query(Note).lookup(Note.author)
@@ -0,0 +1,105 @@
+import pickle
+
+import pytest
+
+from noalchemy.fields import IntField, ListField, SetField, StringField
+from noalchemy.fields.mapping import TrackedDict
+from noalchemy.fields.sequence import TrackedList, TrackedSet
+from noalchemy.odm import Document
+
+
+class TrackedDoc(Document):
+    xs = ListField(IntField(), default_empty=True)
+    ss = SetField(StringField(), default_empty=True)
+
+
+@pytest.fixture
+def update(stored):
+    return stored(TrackedDoc(xs=list(range(10)), ss={"a", "b"}), "xs", "ss")
+
+
+def test_unchanged(update):
+    assert update(lambda doc: None) == {}
+
+
+def test_append_pushes(update):
+    ops = update(lambda doc: doc.xs.extend([10, 11]))
+    assert ops == {"$push": {"xs": {"$each": [10, 11]}}}
+
+
+def test_remove_pulls(update):
+    assert update(lambda doc: doc.xs.remove(3)) == {"$pull": {"xs": 3}}
+
+    def remove_two(doc):
+        doc.xs.remove(4)
+        doc.xs.remove(5)
+
+    assert update(remove_two) == {"$pullAll": {"xs": [4, 5]}}
+
+
+def test_assign_item_sets_position(update):
+    ops = update(lambda doc: doc.xs.__setitem__(0, 100))
+    assert ops == {"$set": {"xs.0": 100}}
+
+
+def test_mixed_changes_set_whole_list(update):
+    def append_and_remove(doc):
+        doc.xs.append(1)
+        doc.xs.remove(0)
+
+    ops = update(append_and_remove)
+    assert ops == {"$set": {"xs": [1, 2, 3, 4, 5, 6, 7, 8, 9, 1]}}
+    ops = update(lambda doc: doc.xs.insert(0, -1))
+    assert list(ops) == ["$set"]
+
+
+def test_reassigned_list_is_set(update):
+    ops = update(lambda doc: setattr(doc, "xs", [1, 2]))
+    assert ops == {"$set": {"xs": [1, 2]}}
+    assert update(lambda doc: doc.xs.append(3)) == {
+        "$push": {"xs": {"$each": [3]}}
+    }
+
+
+def test_set_add_and_discard(update):
+    ops = update(lambda doc: doc.ss.add("c"))
+    assert ops == {"$addToSet": {"ss": {"$each": ["c"]}}}
+    ops = update(lambda doc: doc.ss.discard("a"))
+    assert ops == {"$pullAll": {"ss": ["a"]}}
+
+    def add_and_discard(doc):
+        doc.ss.add("z")
+        doc.ss.discard("b")
+
+    ops = update(add_and_discard)
+    assert list(ops) == ["$set"]
+    assert sorted(ops["$set"]["ss"]) == ["c", "z"]
+
+
+def test_changes_cleared_after_commit(Session, update):
+    session = Session()
+    doc = session.query(TrackedDoc).one()
+    doc.xs.append(10)
+    session.update(doc)
+    session.commit()
+    doc.xs.append(11)
+    assert doc.get_dirty_ops() == {"$push": {"xs": {"$each": [11]}}}
+    session.update(doc)
+    session.commit()
+    assert Session().query(TrackedDoc).one().xs == list(range(12))
+
+
+@pytest.mark.parametrize(
+    "container, change",
+    [
+        (TrackedList([1, 2]), lambda value: value.append(3)),
+        (TrackedSet({1, 2}), lambda value: value.add(3)),
+        (TrackedDict(a=1), lambda value: value.__setitem__("b", 2)),
+    ],
+)
+def test_pickled_containers_keep_changes(container, change):
+    change(container)
+    copy = pickle.loads(pickle.dumps(container))
+    assert type(copy) is type(container)
+    assert copy == container
+    assert copy.__dict__ == container.__dict__
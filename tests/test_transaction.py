@@ -0,0 +1,162 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from noalchemy import create_engine
+from noalchemy.exc import TransactionException
+from noalchemy.fields import StringField
+from noalchemy.odm import Document, sessionmaker
+from noalchemy.odm.query_expression import BadQueryException
+from noalchemy.odm.session import Session as _Session
+from noalchemy.odm.transaction import MockClientSession
+
+
+class Entry(Document):
+    name = StringField()
+
+
+def names(Session):
+    return sorted(entry.name for entry in Session().query(Entry))
+
+
+class TransientFailure:
+    """Records the size of the batches written, and makes the
+    ``fail_at``-th one fail with a transient error once written"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail_at = 1
+
+    def wrap(self, execute_batch):
+        def flaky(session, ops, result):
+            self.calls.append(len(ops))
+            execute_batch(session, ops, result)
+            if len(self.calls) == self.fail_at:
+                error = OperationFailure("Write conflict", 112)
+                error._add_error_label("TransientTransactionError")
+                raise error
+
+        return flaky
+
+
+@pytest.fixture
+def transient(monkeypatch):
+    failure = TransientFailure()
+    monkeypatch.setattr(
+        _Session, "_execute_batch", failure.wrap(_Session._execute_batch)
+    )
+    return failure
+
+
+def test_native_transaction_commits(Session):
+    session = Session()
+    session.begin_trans(native=True)
+    assert isinstance(session.client_session, MockClientSession)
+    session.add(Entry(name="a"))
+    session.add(Entry(name="b"))
+    assert names(Session) == []
+    session.end_trans()
+    assert session.client_session is None
+    assert names(Session) == ["a", "b"]
+
+
+def test_flushed_writes_visible_and_aborted(Session):
+    session = Session()
+    session.begin_trans(native=True)
+    session.add(Entry(name="a"))
+    session.flush()
+    assert session.query(Entry).filter(Entry.name == "a").count() == 1
+    session.end_trans(ValueError, ValueError(), None)
+    assert names(Session) == []
+
+
+def test_transient_error_retried(Session, transient):
+    session = Session()
+    session.begin_trans(native=True)
+    session.add(Entry(name="a"))
+    session.end_trans()
+    assert transient.calls == [1, 1]
+    assert names(Session) == ["a"]
+
+
+def test_flushed_writes_replayed_on_transient_error(Session, transient):
+    transient.fail_at = 2
+    session = Session()
+    session.begin_trans(native=True)
+    session.add(Entry(name="a"))
+    session.flush()
+    session.add(Entry(name="b"))
+    session.end_trans()
+    # a, then b failing, then both in the retry
+    assert transient.calls == [1, 1, 2]
+    assert names(Session) == ["a", "b"]
+
+
+def test_failed_nested_transaction_drops_its_flushed_writes(Session):
+    session = Session()
+    session.begin_trans(native=True)
+    session.add(Entry(name="a"))
+    session.flush()
+    session.begin_trans()
+    session.add(Entry(name="b"))
+    session.flush()
+    session.end_trans(ValueError, ValueError(), None)
+    session.add(Entry(name="c"))
+    session.end_trans()
+    assert names(Session) == ["a", "c"]
+
+
+def test_failed_transaction_drops_writes_flushed_by_nested_ones(Session):
+    session = Session()
+    session.begin_trans(native=True)
+    session.add(Entry(name="a"))
+    session.flush()
+    session.begin_trans()
+    session.begin_trans()
+    session.add(Entry(name="b"))
+    session.flush()
+    session.end_trans()
+    session.add(Entry(name="c"))
+    session.end_trans(ValueError, ValueError(), None)
+    session.add(Entry(name="d"))
+    session.end_trans()
+    assert names(Session) == ["a", "d"]
+
+
+def test_failed_transaction_drops_writes_queued_by_nested_ones(Session):
+    session = Session()
+    session.begin_trans()
+    session.add(Entry(name="a"))
+    session.begin_trans()
+    session.begin_trans()
+    session.add(Entry(name="b"))
+    session.add(Entry(name="c"))
+    session.end_trans()
+    session.end_trans(ValueError, ValueError(), None)
+    session.add(Entry(name="d"))
+    session.end_trans()
+    assert names(Session) == ["a", "d"]
+
+
+def test_flush_needs_native_transaction(Session):
+    with pytest.raises(TransactionException):
+        Session().flush()
+
+
+def test_no_parallel_scan_in_native_transaction(Session):
+    session = Session()
+    session.begin_trans(native=True)
+    with pytest.raises(BadQueryException):
+        session.query(Entry).parallel_iter()
+    session.end_trans()
+
+
+def test_engine_default():
+    engine = create_engine(
+        "mongodb://localhost:27017/test", mock=True, native_transactions=True
+    )
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    with session:
+        assert session.client_session is not None
+        session.add(Entry(name="a"))
+    assert names(Session) == ["a"]